@@ -3,11 +3,25 @@ Authentication utilities for JWT token management.
 
 Uses python-jose for JWT encoding/decoding with HS256 algorithm.
 Source: python-jose documentation (verified via MCP)
+
+python-jose (and its cryptography backend) is imported lazily: it is the
+heaviest import in the app. main.py preloads it during lifespan warm-up,
+in parallel with the database pool, via preload().
 """
 
 from datetime import datetime, timedelta
-from jose import JWTError, jwt
-from app.config import settings
+from app.config import get_settings
+
+
+def _jose():
+    """Import python-jose on first use (cached by the import system)"""
+    from jose import JWTError, jwt
+    return JWTError, jwt
+
+
+def preload() -> None:
+    """Import JWT dependencies ahead of the first request"""
+    _jose()
 
 
 def create_access_token(data: dict) -> str:
@@ -27,6 +41,9 @@ def create_access_token(data: dict) -> str:
     Returns:
         Encoded JWT token string
     """
+    _, jwt = _jose()
+    settings = get_settings()
+    
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(hours=settings.JWT_EXPIRATION_HOURS)
     
@@ -60,6 +77,9 @@ def decode_access_token(token: str) -> dict:
     Raises:
         ValueError: If token is invalid or expired (wraps JWTError)
     """
+    JWTError, jwt = _jose()
+    settings = get_settings()
+    
     try:
         payload = jwt.decode(
             token,
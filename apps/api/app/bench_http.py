@@ -0,0 +1,249 @@
+"""
+HTTP profile benchmark: requests per Mini App session and worker CPU.
+
+Replays simulated Mini App sessions in-process through two middleware
+profiles and reports, per profile:
+
+- HTTP requests sent by the browser (API calls + CORS preflights), using a
+  browser preflight cache model: a non-simple cross-origin request needs an
+  OPTIONS preflight unless one for the same URL and method was cached
+  within min(Access-Control-Max-Age, browser cap).
+- Worker CPU time to serve them (time.process_time) and response bytes.
+
+Profiles:
+- baseline: previous main.py setup (CORSMiddleware default max_age=600,
+  no compression)
+- tuned: install_middleware() with the given CORS_MAX_AGE; compression
+  only with --compression (COMPRESSION_ENABLED is off by default)
+
+The app under test has stand-in routes returning the same payload shapes as
+the real routers, so no database is needed. Network, TLS and nginx costs
+are not included; every avoided preflight saves a full round-trip on top.
+
+What it shows: the tuned profile sends fewer requests (fewer preflights).
+It does not reliably reduce in-process worker CPU: CORSMiddleware answers
+a preflight without routing, so an avoided preflight is cheap in-process,
+and the difference is within run-to-run noise for the default session
+model. All stand-in responses are below 1 KB, so --compression only adds
+per-request overhead here. The CPU savings of this change come from
+outside the process (fewer TLS handshakes and connections through nginx
+keep-alive), which this benchmark does not measure.
+
+Usage (from apps/api):
+    python -m app.bench_http
+    python -m app.bench_http --users 500 --sessions 4 --gap-minutes 15
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+
+from fastapi import FastAPI, Response
+from fastapi.middleware.cors import CORSMiddleware
+
+from app.config import Settings
+from app.middleware import install_middleware
+
+ORIGIN = b"https://app.yourdomain.com"
+
+# Chromium caps Access-Control-Max-Age at 2 hours (Firefox: 24 hours)
+BROWSER_MAX_AGE_CAP = 7200
+
+
+def _stand_in_app() -> FastAPI:
+    """Routes with the same methods and payload shapes as the real API"""
+    app = FastAPI()
+    user = {"id": 42, "telegram_id": 123456789, "first_name": "Alice", "last_name": None, "username": "alice"}
+    prefs = {"theme_mode": "premium", "reduced_motion": False}
+
+    @app.post("/api/auth/validate")
+    async def validate(response: Response):
+        response.set_cookie("session", "x" * 180, httponly=True, secure=True, samesite="none")
+        return {"success": True, "user": user}
+
+    @app.get("/api/preferences")
+    async def get_prefs():
+        return prefs
+
+    @app.put("/api/preferences")
+    async def put_prefs():
+        return prefs
+
+    @app.post("/api/events", status_code=202)
+    async def post_events():
+        return {"accepted": 5, "dropped": 0}
+
+    return app
+
+
+def build_app(profile: str, cors_max_age: int, compression: bool, compression_min_size: int) -> FastAPI:
+    app = _stand_in_app()
+    if profile == "baseline":
+        app.add_middleware(
+            CORSMiddleware,
+            allow_origins=[ORIGIN.decode()],
+            allow_credentials=True,
+            allow_methods=["*"],
+            allow_headers=["*"],
+        )
+    else:
+        settings = Settings.model_construct(
+            ALLOWED_ORIGINS=[ORIGIN.decode()],
+            CORS_MAX_AGE=cors_max_age,
+            COMPRESSION_ENABLED=compression,
+            COMPRESSION_MIN_SIZE=compression_min_size,
+            PROFILING_ENABLED=False,
+        )
+        install_middleware(app, settings)
+    return app
+
+
+def session_calls(minutes: int, calls_per_minute: int) -> list[tuple[float, str, str, bool]]:
+    """
+    One Mini App session: (seconds from start, method, path, needs_preflight).
+
+    JSON POST/PUT with credentials are non-simple requests (preflighted);
+    a credentialed GET without custom headers is a simple request.
+    """
+    calls = [
+        (0.0, "POST", "/api/auth/validate", True),
+        (0.5, "GET", "/api/preferences", False),
+    ]
+    interval = 60 / calls_per_minute
+    for i in range(minutes * calls_per_minute):
+        calls.append((1 + i * interval, "POST", "/api/events", True))
+    calls.append((minutes * 60 / 2, "PUT", "/api/preferences", True))
+    return sorted(calls)
+
+
+@dataclass
+class Result:
+    requests: int = 0
+    preflights: int = 0
+    cpu_seconds: float = 0.0
+    bytes_out: int = 0
+
+
+async def _call(app, method: str, path: str, headers: list, body: bytes = b"") -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "https",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("api.yourdomain.com", 443),
+    }
+    received = False
+    size = 0
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+        else:
+            size += sum(len(k) + len(v) for k, v in message["headers"])
+
+    await app(scope, receive, send)
+    return size
+
+
+async def run_profile(app, max_age: int, args) -> Result:
+    cache_ttl = min(max_age, BROWSER_MAX_AGE_CAP)
+    body = json.dumps({"events": [{"type": "demo_interaction", "payload": {"demo": "popups"}}] * 5}).encode()
+    result = Result()
+
+    started = time.process_time()
+    for _ in range(args.users):
+        # Preflight cache of one WebView: (method, path) -> expiry (seconds)
+        preflight_cache: dict[tuple[str, str], float] = {}
+        for session in range(args.sessions):
+            session_start = session * (args.minutes + args.gap_minutes) * 60
+            for offset, method, path, needs_preflight in session_calls(args.minutes, args.calls_per_minute):
+                now = session_start + offset
+                if needs_preflight and preflight_cache.get((method, path), -1) <= now:
+                    result.bytes_out += await _call(app, "OPTIONS", path, [
+                        (b"origin", ORIGIN),
+                        (b"access-control-request-method", method.encode()),
+                        (b"access-control-request-headers", b"content-type"),
+                    ])
+                    result.preflights += 1
+                    result.requests += 1
+                    preflight_cache[(method, path)] = now + cache_ttl
+
+                headers = [
+                    (b"origin", ORIGIN),
+                    (b"cookie", b"session=" + b"x" * 180),
+                    (b"accept-encoding", b"gzip, deflate, br"),
+                ]
+                if method != "GET":
+                    headers.append((b"content-type", b"application/json"))
+                result.bytes_out += await _call(app, method, path, headers, body if method != "GET" else b"")
+                result.requests += 1
+    result.cpu_seconds = time.process_time() - started
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark API middleware profiles")
+    parser.add_argument("--users", type=int, default=200, help="Simulated users (default: 200)")
+    parser.add_argument("--sessions", type=int, default=3, help="Sessions per user (default: 3)")
+    parser.add_argument("--minutes", type=int, default=10, help="Session length in minutes (default: 10)")
+    parser.add_argument("--gap-minutes", type=int, default=20, help="Minutes between sessions (default: 20)")
+    parser.add_argument("--calls-per-minute", type=int, default=6, help="Event batches per minute (default: 6)")
+    parser.add_argument("--cors-max-age", type=int, default=86400, help="Tuned Access-Control-Max-Age")
+    parser.add_argument("--compression", action="store_true", help="Enable compression in the tuned profile")
+    parser.add_argument("--compression-min-size", type=int, default=1024)
+    parser.add_argument("--rounds", type=int, default=5, help="Runs per profile, fastest kept (default: 5)")
+    args = parser.parse_args()
+
+    # Alternate profiles over several rounds and keep each profile's fastest
+    # run: in-process CPU timings vary by ~10% between runs
+    profiles = {
+        "baseline": (build_app("baseline", args.cors_max_age, False, args.compression_min_size), 600),
+        "tuned": (build_app("tuned", args.cors_max_age, args.compression, args.compression_min_size), args.cors_max_age),
+    }
+    results: dict[str, Result] = {}
+    for _ in range(args.rounds):
+        for profile, (app, max_age) in profiles.items():
+            result = asyncio.run(run_profile(app, max_age, args))
+            if profile not in results or result.cpu_seconds < results[profile].cpu_seconds:
+                results[profile] = result
+
+    sessions = args.users * args.sessions
+    print(f"{args.users} users x {args.sessions} sessions of {args.minutes} min "
+          f"({args.gap_minutes} min apart), browser max-age cap {BROWSER_MAX_AGE_CAP}s\n")
+    print(f"{'profile':10} {'req/session':>12} {'preflights':>11} {'CPU ms':>9} {'KiB out':>9}")
+    for profile, result in results.items():
+        print(
+            f"{profile:10} {result.requests / sessions:12.1f} {result.preflights:11d} "
+            f"{result.cpu_seconds * 1000:9.0f} {result.bytes_out / 1024:9.0f}"
+        )
+
+    base, tuned = results["baseline"], results["tuned"]
+    print(
+        f"\nrequests: {100 * (1 - tuned.requests / base.requests):.1f}% fewer, "
+        f"worker CPU: {100 * (tuned.cpu_seconds / base.cpu_seconds - 1):+.1f}%"
+    )
+    print(
+        "note: in-process CPU differences of this size are run-to-run noise; "
+        "this profile is not expected to reduce worker CPU (see module docstring)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Size-thresholded response compression middleware.
+
+Pure ASGI middleware that compresses complete (non-streaming) responses of
+at least `minimum_size` bytes with brotli when the client accepts it and
+the optional Brotli package is installed (`pip install Brotli`; it is
+deliberately not in requirements.txt), otherwise gzip. Small bodies
+are passed through untouched: below ~1 KB compression costs more worker
+CPU than it saves on the wire.
+
+Responses that already have a Content-Encoding, are streamed in several
+chunks, or have a non-compressible content type are never touched.
+"""
+
+import gzip
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # Optional dependency: fall back to gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    b"application/json",
+    b"text/",
+    b"application/javascript",
+    b"image/svg+xml",
+)
+
+
+def _parse_accept_encoding(accept_encoding: str) -> dict[str, float]:
+    """Map each coding in an Accept-Encoding header to its q-value"""
+    qvalues = {}
+    for part in accept_encoding.split(","):
+        coding, *params = part.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value.strip())
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+    return qvalues
+
+
+def _choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Highest-q supported coding the client accepts (q > 0), brotli on ties"""
+    qvalues = _parse_accept_encoding(accept_encoding)
+    wildcard = qvalues.get("*", 0.0)
+    candidates = ("br", "gzip") if brotli is not None else ("gzip",)
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = qvalues.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compress larger responses with brotli or gzip.
+
+    Args:
+        app: ASGI application
+        minimum_size: Smallest body (bytes) worth compressing
+        gzip_level: gzip compression level (1-9)
+        brotli_quality: brotli quality (0-11); 4 is fast with gzip-9-like ratio
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+
+        encoding = _choose_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            if start_message is not None:
+                start, start_message = start_message, None
+                body = message.get("body", b"")
+
+                if (
+                    message.get("more_body", False)
+                    or len(body) < self.minimum_size
+                    or not self._compressible(start["headers"])
+                ):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                if encoding == "br":
+                    body = brotli.compress(body, quality=self.brotli_quality)
+                else:
+                    body = gzip.compress(body, compresslevel=self.gzip_level)
+
+                headers = [
+                    (name, value) for name, value in start["headers"]
+                    if name not in (b"content-length", b"vary")
+                ]
+                vary = [value for name, value in start["headers"] if name == b"vary"]
+                headers += [
+                    (b"content-encoding", encoding.encode()),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"vary", b", ".join(vary + [b"Accept-Encoding"])),
+                ]
+                await send({**start, "headers": headers})
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+        # Response ended without a body message
+        if start_message is not None:
+            await send(start_message)
+
+    @staticmethod
+    def _compressible(headers) -> bool:
+        content_type = b""
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
@@ -2,8 +2,14 @@
 Configuration management using pydantic-settings.
 
 All settings are loaded from environment variables.
+
+Settings are built lazily on first use via get_settings() (cached), so
+importing a module does not parse .env. Invalid or missing values fail
+with a single readable error instead of a pydantic traceback.
 """
 
+from functools import lru_cache
+from pydantic import ValidationError, model_validator
 from pydantic_settings import BaseSettings
 from typing import List
 
@@ -33,6 +39,20 @@ class Settings(BaseSettings):
     # Verified: allow_credentials=True requires explicit allow_origins list
     ALLOWED_ORIGINS: List[str]
     
+    # CORS_MAX_AGE: Seconds browsers may cache a preflight (Access-Control-Max-Age)
+    # Each cached preflight saves an OPTIONS round-trip before credentialed calls.
+    # Browsers cap it (Chromium: 7200, Firefox: 86400).
+    CORS_MAX_AGE: int = 86400
+    
+    # Response compression (brotli if the optional Brotli package is
+    # installed and accepted by the client, else gzip). Brotli is not in
+    # requirements.txt: install it separately to enable it
+    # Off by default: current API responses are all below
+    # COMPRESSION_MIN_SIZE, so the layer would only add per-request overhead
+    # COMPRESSION_MIN_SIZE: Smaller bodies are sent uncompressed
+    COMPRESSION_ENABLED: bool = False
+    COMPRESSION_MIN_SIZE: int = 1024
+    
     # Cookie settings
     # COOKIE_DOMAIN: Use ".yourdomain.com" to share cookies between app.* and api.*
     # Empty string ("") means same-domain only (not shared across subdomains)
@@ -52,9 +72,99 @@ class Settings(BaseSettings):
     # 86400 seconds = 24 hours
     COOKIE_MAX_AGE: int = 86400
     
+    # Database pool
+    # DB_POOL_MIN_SIZE connections are opened and warmed up (in parallel)
+    # before the worker starts accepting requests
+    DB_POOL_MIN_SIZE: int = 5
+    DB_POOL_MAX_SIZE: int = 20
+    DB_COMMAND_TIMEOUT: float = 60
+    
+    # Activity events ingestion (POST /api/events)
+    # EVENTS_QUEUE_MAX_SIZE: Upper bound of the in-memory queue per worker.
+    # Events beyond this are dropped (and counted) instead of growing memory.
+    # EVENTS_FLUSH_BATCH_SIZE: Max rows written per COPY round-trip
+    # EVENTS_FLUSH_INTERVAL_SECONDS: Max time an event waits before being flushed
+    # EVENTS_SHUTDOWN_TIMEOUT_SECONDS: Time budget for draining the queue on shutdown
+    EVENTS_QUEUE_MAX_SIZE: int = 10000
+    EVENTS_FLUSH_BATCH_SIZE: int = 500
+    EVENTS_FLUSH_INTERVAL_SECONDS: float = 1.0
+    EVENTS_SHUTDOWN_TIMEOUT_SECONDS: float = 10.0
+    
+    # Admin endpoints and profiling (opt-in)
+    # ADMIN_TOKEN: Mounts /api/admin (e.g. /api/admin/events/stats); required
+    #   in the X-Admin-Token header (min 32 chars, empty = no admin endpoints)
+    # PROFILING_ENABLED: Enables /api/admin/profile, /api/admin/slow-requests
+    #   and the slow-request capture middleware (requires ADMIN_TOKEN)
+    # PROFILING_SAMPLE_INTERVAL_MS: Stack sampling period (10ms ~ 1% overhead)
+    # PROFILE_DIR: Directory shared by all workers (writable by the service
+    #   user), used to profile every worker and merge their slow requests
+    # SLOW_REQUEST_THRESHOLD_MS: Requests slower than this are captured
+    # SLOW_REQUEST_BUFFER_SIZE: Captured requests kept per worker (ring buffer)
+    PROFILING_ENABLED: bool = False
+    ADMIN_TOKEN: str = ""
+    PROFILING_SAMPLE_INTERVAL_MS: float = 10.0
+    PROFILE_MAX_SECONDS: int = 60
+    PROFILE_DIR: str = "/var/lib/tma-studio/profiles"
+    SLOW_REQUEST_THRESHOLD_MS: int = 500
+    SLOW_REQUEST_BUFFER_SIZE: int = 100
+    
+    # User directory (opt-in in-process telegram_id index, see app/user_directory.py)
+    # USER_DIRECTORY_SNAPSHOT_PATH: Memory-mapped snapshot shared by all workers;
+    #   must be in a directory the service user can write to (StateDirectory)
+    # USER_DIRECTORY_REFRESH_SECONDS: Poll interval for users changes
+    # USER_DIRECTORY_COMPACT_THRESHOLD: Changes kept in memory before a new snapshot
+    USER_DIRECTORY_ENABLED: bool = False
+    USER_DIRECTORY_SNAPSHOT_PATH: str = "/var/lib/tma-studio/user_directory.snapshot"
+    USER_DIRECTORY_REFRESH_SECONDS: float = 5.0
+    USER_DIRECTORY_COMPACT_THRESHOLD: int = 50000
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
+    
+    @model_validator(mode="after")
+    def check_consistency(self) -> "Settings":
+        """Reject combinations that only fail later at runtime (or in browsers)"""
+        if "*" in self.ALLOWED_ORIGINS:
+            raise ValueError("ALLOWED_ORIGINS must list explicit origins (\"*\" is invalid with credentials)")
+        
+        samesite = self.COOKIE_SAMESITE.lower()
+        if samesite not in ("lax", "strict", "none"):
+            raise ValueError("COOKIE_SAMESITE must be one of: lax, strict, none")
+        if samesite == "none" and not self.COOKIE_SECURE:
+            raise ValueError("COOKIE_SAMESITE=none requires COOKIE_SECURE=true")
+        
+        if not 0 < self.DB_POOL_MIN_SIZE <= self.DB_POOL_MAX_SIZE:
+            raise ValueError("DB_POOL_MIN_SIZE must be > 0 and <= DB_POOL_MAX_SIZE")
+        
+        if self.ADMIN_TOKEN and len(self.ADMIN_TOKEN) < 32:
+            raise ValueError("ADMIN_TOKEN must be at least 32 chars")
+        if self.PROFILING_ENABLED and not self.ADMIN_TOKEN:
+            raise ValueError("PROFILING_ENABLED requires ADMIN_TOKEN (min 32 chars)")
+        
+        return self
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """
+    Build settings on first call and cache them for the process.
+    
+    Raises:
+        RuntimeError: If required variables are missing or invalid
+    """
+    try:
+        return Settings()
+    except ValidationError as e:
+        problems = "; ".join(
+            f"{'.'.join(str(part) for part in error['loc']) or 'settings'}: {error['msg']}"
+            for error in e.errors()
+        )
+        raise RuntimeError(f"Invalid configuration: {problems}") from None
 
 
-settings = Settings()
+def __getattr__(name: str):
+    # Backwards compatibility: `from app.config import settings`
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,6 +4,7 @@ Database connection pool management.
 Provides dependency injection for database access.
 """
 
+import asyncio
 import asyncpg
 from typing import Optional
 
@@ -49,3 +50,34 @@ async def close_db_pool() -> None:
     if _db_pool:
         await _db_pool.close()
         _db_pool = None
+
+
+async def warm_up_pool(pool: asyncpg.Pool, count: int) -> None:
+    """
+    Open and verify `count` pool connections concurrently.
+    
+    Holds all connections at once so each one is actually established
+    and has completed a round-trip before the worker accepts traffic.
+    
+    Args:
+        pool: Database connection pool
+        count: Number of connections to warm up (usually min_size)
+    
+    Raises:
+        Exception: First connection error, after releasing the others
+    """
+    results = await asyncio.gather(
+        *(pool.acquire() for _ in range(count)),
+        return_exceptions=True,
+    )
+    conns = [r for r in results if not isinstance(r, BaseException)]
+    errors = [r for r in results if isinstance(r, BaseException)]
+    
+    try:
+        if not errors:
+            await asyncio.gather(*(conn.fetchval("SELECT 1") for conn in conns))
+    finally:
+        await asyncio.gather(*(pool.release(conn) for conn in conns))
+    
+    if errors:
+        raise errors[0]
@@ -0,0 +1,305 @@
+"""
+Batched activity event ingestion.
+
+Events posted to /api/events are placed in a bounded in-memory queue and
+written to Postgres by a single background flusher per worker using
+asyncpg copy_records_to_table (one COPY per batch instead of one INSERT
+per event).
+
+Backpressure: the queue never grows beyond EVENTS_QUEUE_MAX_SIZE. Events
+that do not fit are dropped and counted; the router turns a fully
+rejected batch into 429 so clients back off.
+
+Partitions: monthly partitions are created ahead of time by
+`python -m app.migrate` (every deploy, plus the daily
+tma-studio-partitions.timer) via ensure_partition(), never on the flush
+path. Rows for a month without a partition land in events_default;
+ensure_partition() moves them into the new partition when it is created.
+
+Lifecycle (called by main.py lifespan):
+- start_event_queue(pool) on startup
+- stop_event_queue() on shutdown, before the pool is closed (drains queue)
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+EVENTS_TABLE = "events"
+EVENTS_DEFAULT_PARTITION = "events_default"
+EVENTS_COLUMNS = ("created_at", "user_id", "event_type", "payload")
+
+# Months of partitions kept ready beyond the current one
+PARTITION_MONTHS_AHEAD = 2
+
+
+def _month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value: datetime) -> datetime:
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+class EventQueue:
+    """
+    Bounded event buffer with a background COPY flusher.
+
+    Records are tuples matching EVENTS_COLUMNS. Counters are per worker
+    process (each uvicorn worker owns its own queue).
+    """
+
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        max_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+    ):
+        self._pool = pool
+        self._max_size = max_size
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._buffer: deque = deque()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        # Counters (exposed via stats())
+        self.accepted = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+
+    def offer(self, records: list[tuple]) -> int:
+        """
+        Enqueue as many records as fit without blocking.
+
+        Args:
+            records: Rows matching EVENTS_COLUMNS
+
+        Returns:
+            Number of records accepted; the rest are dropped and counted
+        """
+        if self._closing:
+            self.dropped += len(records)
+            return 0
+
+        free = max(self._max_size - len(self._buffer), 0)
+        accepted = records[:free]
+        self._buffer.extend(accepted)
+        self.accepted += len(accepted)
+        self.dropped += len(records) - len(accepted)
+
+        if len(self._buffer) >= self._batch_size:
+            self._wakeup.set()
+
+        return len(accepted)
+
+    def stats(self) -> dict:
+        """Snapshot of queue depth and counters for this worker"""
+        return {
+            "queued": len(self._buffer),
+            "capacity": self._max_size,
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "failed": self.failed,
+        }
+
+    def start(self) -> None:
+        """Start the background flusher task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="events-flusher")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """
+        Stop accepting events and drain the queue.
+
+        Anything still queued after `timeout` seconds is counted as dropped.
+        """
+        self._closing = True
+        self._wakeup.set()
+
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Event queue drain timed out")
+            self._task = None
+
+        if self._buffer:
+            self.dropped += len(self._buffer)
+            self._buffer.clear()
+
+        logger.info(f"Event queue stopped: {self.stats()}")
+
+    async def _run(self) -> None:
+        """Flush loop: wake on batch size or interval, exit once drained"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            while self._buffer:
+                await self._flush_batch()
+                if not self._closing and len(self._buffer) < self._batch_size:
+                    break
+
+            if self._closing and not self._buffer:
+                return
+
+    async def _flush_batch(self) -> None:
+        batch = [
+            self._buffer.popleft()
+            for _ in range(min(self._batch_size, len(self._buffer)))
+        ]
+
+        try:
+            async with self._pool.acquire() as conn:
+                await conn.copy_records_to_table(
+                    EVENTS_TABLE,
+                    records=batch,
+                    columns=EVENTS_COLUMNS,
+                )
+            self.flushed += len(batch)
+        except asyncio.CancelledError:
+            # stop() timed out mid-COPY: the batch is already off the queue
+            self.failed += len(batch)
+            logger.error(f"Flush of {len(batch)} events cancelled, batch lost")
+            raise
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to flush {len(batch)} events: {e}")
+
+
+def partition_months(now: datetime, months_ahead: int = PARTITION_MONTHS_AHEAD) -> list[datetime]:
+    """Month starts of the current month and the next `months_ahead` months"""
+    start = _month_start(now)
+    months = [start]
+    for _ in range(months_ahead):
+        start = _next_month(start)
+        months.append(start)
+    return months
+
+
+async def ensure_partition(conn: asyncpg.Connection, month: datetime, lock_timeout: str = "5s") -> bool:
+    """
+    Create the monthly partition starting at `month` if it does not exist.
+
+    Runs in one transaction with lock_timeout, so it fails fast
+    (asyncpg.LockNotAvailableError) instead of queueing behind traffic.
+    If events_default already holds rows for that month, which makes a
+    plain CREATE ... PARTITION OF fail, they are moved into the new table
+    before it is attached.
+
+    Returns:
+        True if the partition was created
+    """
+    name = f"{EVENTS_TABLE}_{month:%Y_%m}"
+    if await conn.fetchval("SELECT to_regclass($1)", name) is not None:
+        return False
+
+    start, end = month, _next_month(month)
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+
+    async with conn.transaction():
+        await conn.execute(f"SET LOCAL lock_timeout = '{lock_timeout}'")
+        # Blocks inserts into the default partition until commit, so no row
+        # for this month can slip in between the move and the attach
+        await conn.execute(f"LOCK TABLE {EVENTS_DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE")
+        stray = await conn.fetchval(
+            f"SELECT count(*) FROM {EVENTS_DEFAULT_PARTITION} WHERE created_at >= $1 AND created_at < $2",
+            start, end,
+        )
+
+        if not stray:
+            await conn.execute(f"CREATE TABLE {name} PARTITION OF {EVENTS_TABLE} FOR VALUES {bounds}")
+        else:
+            await conn.execute(f"CREATE TABLE {name} (LIKE {EVENTS_TABLE} INCLUDING DEFAULTS)")
+            await conn.execute(f"""
+                WITH moved AS (
+                    DELETE FROM {EVENTS_DEFAULT_PARTITION}
+                    WHERE created_at >= $1 AND created_at < $2
+                    RETURNING *
+                )
+                INSERT INTO {name} SELECT * FROM moved
+            """, start, end)
+            await conn.execute(f"ALTER TABLE {EVENTS_TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}")
+            logger.warning(f"Moved {stray} events from {EVENTS_DEFAULT_PARTITION} into {name}")
+
+    logger.info(f"Created partition {name}")
+    return True
+
+
+def make_record(
+    event_type: str,
+    payload: Optional[dict],
+    user_id: Optional[int],
+    created_at: Optional[datetime] = None,
+) -> tuple:
+    """Build a row matching EVENTS_COLUMNS"""
+    return (
+        created_at or datetime.now(timezone.utc),
+        user_id,
+        event_type,
+        json.dumps(payload) if payload is not None else None,
+    )
+
+
+# Global event queue (initialized in main.py lifespan)
+_event_queue: Optional[EventQueue] = None
+
+
+def get_event_queue() -> EventQueue:
+    """
+    Dependency for the event queue.
+
+    Returns:
+        EventQueue: Per-worker event queue
+
+    Raises:
+        RuntimeError: If queue is not initialized
+    """
+    if _event_queue is None:
+        raise RuntimeError("Event queue not initialized")
+    return _event_queue
+
+
+def start_event_queue(pool: asyncpg.Pool, **kwargs) -> EventQueue:
+    """
+    Create the global event queue and start its flusher.
+
+    Called by main.py during lifespan startup.
+
+    Args:
+        pool: Database connection pool used by the flusher
+        **kwargs: EventQueue tuning options
+    """
+    global _event_queue
+    _event_queue = EventQueue(pool, **kwargs)
+    _event_queue.start()
+    return _event_queue
+
+
+async def stop_event_queue(timeout: float = 10.0) -> None:
+    """
+    Drain and stop the global event queue.
+
+    Called by main.py during lifespan shutdown, before the pool is closed.
+    """
+    global _event_queue
+    if _event_queue:
+        await _event_queue.stop(timeout=timeout)
+        _event_queue = None
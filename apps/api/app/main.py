@@ -4,40 +4,100 @@ TMA Studio FastAPI Backend
 Main application with CORS, lifespan management, and router registration.
 """
 
+# Must be the first app import: starts the startup clock
+from app import startup
+
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import asyncpg
 import logging
 
-from app.config import settings
-from app import database
-from app.routers import auth, prefs, health
+from app.config import get_settings
+from app.middleware import install_middleware
+from app import auth as auth_utils, database, events, profiling, user_directory
+from app.routers import auth, prefs, health, admin, events as events_router
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+startup.mark("imports")
+
+settings = get_settings()
+startup.mark("config")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
-    # Startup: Create connection pool
+    # Startup: Create connection pool and preload JWT dependencies concurrently
+    # (pool creation waits on the network, the import is CPU work in a thread)
     try:
-        pool = await asyncpg.create_pool(
-            dsn=settings.DATABASE_URL,
-            min_size=5,
-            max_size=20,
-            command_timeout=60,
+        pool, _ = await asyncio.gather(
+            startup.timed("pool", asyncpg.create_pool(
+                dsn=settings.DATABASE_URL,
+                min_size=settings.DB_POOL_MIN_SIZE,
+                max_size=settings.DB_POOL_MAX_SIZE,
+                command_timeout=settings.DB_COMMAND_TIMEOUT,
+                init=profiling.instrument_connection if settings.PROFILING_ENABLED else None,
+            )),
+            startup.timed("preload", asyncio.to_thread(auth_utils.preload)),
         )
         database.set_db_pool(pool)
         logger.info("Database connection pool created")
+        
+        # Startup: Warm up min_size connections in parallel before serving
+        await startup.timed(
+            "warmup", database.warm_up_pool(pool, settings.DB_POOL_MIN_SIZE)
+        )
     except Exception as e:
         logger.error(f"Failed to create database pool: {e}")
         raise
     
+    # Startup: Load in-process user directory (opt-in)
+    if settings.USER_DIRECTORY_ENABLED:
+        await user_directory.start_user_directory(
+            pool,
+            snapshot_path=settings.USER_DIRECTORY_SNAPSHOT_PATH,
+            refresh_interval=settings.USER_DIRECTORY_REFRESH_SECONDS,
+            compact_threshold=settings.USER_DIRECTORY_COMPACT_THRESHOLD,
+        )
+    
+    # Startup: Start batched event flusher
+    events.start_event_queue(
+        pool,
+        max_size=settings.EVENTS_QUEUE_MAX_SIZE,
+        batch_size=settings.EVENTS_FLUSH_BATCH_SIZE,
+        flush_interval=settings.EVENTS_FLUSH_INTERVAL_SECONDS,
+    )
+    
+    # Startup: Start stack sampler (opt-in)
+    if settings.PROFILING_ENABLED:
+        profiling.start_profiler(
+            profile_dir=settings.PROFILE_DIR,
+            sample_interval_ms=settings.PROFILING_SAMPLE_INTERVAL_MS,
+            slow_threshold_ms=settings.SLOW_REQUEST_THRESHOLD_MS,
+            buffer_size=settings.SLOW_REQUEST_BUFFER_SIZE,
+        )
+        logger.info("Profiler started")
+    
+    startup.set_ready(logger=logger)
+    
     yield
     
+    # Shutdown: Stop reporting ready so health checks route around this worker
+    startup.set_ready(False)
+    
+    # Shutdown: Drain queued events while the pool is still open
+    await events.stop_event_queue(timeout=settings.EVENTS_SHUTDOWN_TIMEOUT_SECONDS)
+    
+    # Shutdown: Stop user directory refresher
+    await user_directory.stop_user_directory()
+    
+    # Shutdown: Stop stack sampler
+    profiling.stop_profiler()
+    
     # Shutdown: Close connection pool
     await database.close_db_pool()
     logger.info("Database connection pool closed")
@@ -49,20 +109,13 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# CORS configuration for cookie-based auth
-# Source: FastAPI CORS documentation
-# Verified: allow_credentials=True requires explicit origins (not "*")
-# CRITICAL RULE: When allow_credentials=True, allow_origins MUST be explicit list
-# Using "*" with credentials will fail in browsers (CORS policy violation)
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.ALLOWED_ORIGINS,  # Must be explicit list, e.g., ["https://app.yourdomain.com"]
-    allow_credentials=True,  # Required for cookies
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Middleware profile: compression, slow-request capture (opt-in), CORS
+install_middleware(app, settings)
 
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(prefs.router, prefix="/api/preferences", tags=["preferences"])
+app.include_router(events_router.router, prefix="/api/events", tags=["events"])
 app.include_router(health.router, prefix="/api", tags=["health"])
+if settings.ADMIN_TOKEN:
+    app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
@@ -0,0 +1,50 @@
+"""
+API middleware profile.
+
+Order matters: the last added middleware runs first (outermost).
+Compression is innermost so it only sees final response bodies; CORS is
+outermost so preflight OPTIONS requests are answered before profiling,
+compression and routing run.
+
+Shared by main.py and the HTTP benchmark (app/bench_http.py).
+"""
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from app import profiling
+from app.compression import CompressionMiddleware
+from app.config import Settings
+
+
+def install_middleware(app: FastAPI, settings: Settings) -> None:
+    """
+    Add the API middleware stack to app.
+    
+    Args:
+        app: FastAPI application
+        settings: Application settings
+    """
+    # Response compression for larger bodies (size-thresholded, opt-in)
+    if settings.COMPRESSION_ENABLED:
+        app.add_middleware(CompressionMiddleware, minimum_size=settings.COMPRESSION_MIN_SIZE)
+
+    # Slow-request capture (opt-in)
+    if settings.PROFILING_ENABLED:
+        app.add_middleware(profiling.SlowRequestMiddleware)
+
+    # CORS configuration for cookie-based auth
+    # Source: FastAPI CORS documentation
+    # Verified: allow_credentials=True requires explicit origins (not "*")
+    # CRITICAL RULE: When allow_credentials=True, allow_origins MUST be explicit list
+    # Using "*" with credentials will fail in browsers (CORS policy violation)
+    # max_age: lets browsers cache preflights instead of sending OPTIONS before
+    # every credentialed JSON request from the cross-domain Mini App
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.ALLOWED_ORIGINS,  # Must be explicit list, e.g., ["https://app.yourdomain.com"]
+        allow_credentials=True,  # Required for cookies
+        allow_methods=["*"],
+        allow_headers=["*"],
+        max_age=settings.CORS_MAX_AGE,
+    )
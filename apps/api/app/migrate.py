@@ -0,0 +1,488 @@
+"""
+Online, lock-aware SQL migration runner.
+
+Applies apps/api/migrations/NNN_name.sql files in order and records them in
+a schema_migrations version table. Designed to run during deploys against
+a live database:
+
+- Every migration runs with a short lock_timeout, so a DDL statement that
+  cannot get its lock fails fast instead of queueing behind long
+  transactions (and blocking all new queries on the hot table behind it).
+  Lock timeouts are retried with backoff.
+- Files starting with a "-- migrate: no-transaction" directive run
+  statement by statement outside a transaction. Required for
+  CREATE/DROP INDEX CONCURRENTLY. Such migrations must be idempotent
+  (IF [NOT] EXISTS), since a failure can leave them partially applied.
+- A CREATE INDEX CONCURRENTLY that fails (e.g. lock_timeout in its wait
+  phase) leaves an INVALID index behind, which IF NOT EXISTS would then
+  skip. The runner drops that index before every attempt, and refuses to
+  record a no-transaction migration while any invalid index remains.
+- A Postgres advisory lock ensures only one runner applies migrations at a
+  time (e.g. concurrent deploy scripts).
+- After migrating, upcoming monthly events partitions are created
+  (app/events.py ensure_partition) under the same lock_timeout and
+  retries. The daily tma-studio-partitions.timer runs --partitions.
+
+Usage (from apps/api):
+    python -m app.migrate               # apply pending migrations + partitions
+    python -m app.migrate --status      # list applied/pending migrations
+    python -m app.migrate --dry-run     # show what would be applied
+    python -m app.migrate --partitions  # only create upcoming partitions
+
+Reads DATABASE_URL from the environment (or apps/api/.env).
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from os import getenv
+from pathlib import Path
+from typing import Optional
+
+import asyncpg
+from dotenv import load_dotenv
+
+from app import events
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
+# Arbitrary constant key for pg_advisory_lock (one runner at a time)
+ADVISORY_LOCK_KEY = 727_001
+
+DEFAULT_LOCK_TIMEOUT = "5s"
+DEFAULT_RETRIES = 5
+
+_FILENAME_RE = re.compile(r"^(\d+)_([\w-]+)\.sql$")
+_DIRECTIVE_RE = re.compile(r"^--\s*migrate:\s*(.+)$", re.IGNORECASE)
+_CONCURRENT_INDEX_RE = re.compile(
+    r"^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?"
+    r"(?!ON\b)(\"[^\"]+\"|[\w.]+)",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class Migration:
+    """A migration file parsed from MIGRATIONS_DIR"""
+    version: str
+    name: str
+    path: Path
+    sql: str
+    checksum: str
+    transactional: bool = True
+    lock_timeout: Optional[str] = None
+    statements: list[str] = field(default_factory=list)
+
+
+def split_statements(sql: str) -> list[str]:
+    """
+    Split a SQL script into statements on top-level semicolons.
+
+    Handles '--' comments, single-quoted strings, double-quoted identifiers
+    and $tag$ dollar-quoted bodies. Empty/comment-only statements are dropped.
+    """
+    statements = []
+    current = []
+    i = 0
+    length = len(sql)
+
+    while i < length:
+        char = sql[i]
+
+        if char == "-" and sql.startswith("--", i):
+            end = sql.find("\n", i)
+            end = length if end == -1 else end
+            current.append(sql[i:end])
+            i = end
+            continue
+
+        if char in ("'", '"'):
+            end = i + 1
+            while end < length:
+                if sql[end] == char:
+                    # Doubled quote is an escaped quote
+                    if end + 1 < length and sql[end + 1] == char:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            current.append(sql[i:end + 1])
+            i = end + 1
+            continue
+
+        if char == "$":
+            match = re.match(r"\$[A-Za-z_]*\$", sql[i:])
+            if match:
+                tag = match.group(0)
+                end = sql.find(tag, i + len(tag))
+                end = length if end == -1 else end + len(tag)
+                current.append(sql[i:end])
+                i = end
+                continue
+
+        if char == ";":
+            statements.append("".join(current))
+            current = []
+            i += 1
+            continue
+
+        current.append(char)
+        i += 1
+
+    statements.append("".join(current))
+
+    def has_code(statement: str) -> bool:
+        return any(
+            line.strip() and not line.strip().startswith("--")
+            for line in statement.splitlines()
+        )
+
+    return [s.strip() for s in statements if has_code(s)]
+
+
+def parse_migration(path: Path) -> Migration:
+    """
+    Parse a migration file and its header directives.
+
+    Directives are leading comment lines of the form:
+        -- migrate: no-transaction
+        -- migrate: lock_timeout=10s
+    """
+    match = _FILENAME_RE.match(path.name)
+    if not match:
+        raise ValueError(f"Invalid migration filename: {path.name}")
+
+    sql = path.read_text(encoding="utf-8")
+    migration = Migration(
+        version=match.group(1),
+        name=match.group(2),
+        path=path,
+        sql=sql,
+        checksum=hashlib.sha256(sql.encode()).hexdigest(),
+    )
+
+    for line in sql.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith("--"):
+            break
+        directive = _DIRECTIVE_RE.match(line)
+        if not directive:
+            continue
+        for option in directive.group(1).split(","):
+            option = option.strip()
+            if option == "no-transaction":
+                migration.transactional = False
+            elif option.startswith("lock_timeout="):
+                migration.lock_timeout = option.split("=", 1)[1]
+            else:
+                raise ValueError(f"{path.name}: unknown directive '{option}'")
+
+    if not migration.transactional:
+        migration.statements = split_statements(sql)
+
+    return migration
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR) -> list[Migration]:
+    """Load all migrations from directory, ordered by version"""
+    migrations = [
+        parse_migration(path)
+        for path in sorted(directory.glob("*.sql"))
+    ]
+    versions = [m.version for m in migrations]
+    duplicates = {v for v in versions if versions.count(v) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate migration versions: {sorted(duplicates)}")
+    return sorted(migrations, key=lambda m: int(m.version))
+
+
+async def ensure_version_table(conn: asyncpg.Connection) -> None:
+    """Create the schema_migrations version table if missing"""
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(32) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    """)
+
+
+async def applied_versions(conn: asyncpg.Connection) -> dict[str, str]:
+    """Return {version: checksum} of applied migrations"""
+    rows = await conn.fetch("SELECT version, checksum FROM schema_migrations")
+    return {row["version"]: row["checksum"] for row in rows}
+
+
+def concurrent_index_name(statement: str) -> Optional[str]:
+    """Index name built by a CREATE INDEX CONCURRENTLY statement, else None"""
+    code = re.sub(r"--[^\n]*", "", statement)
+    match = _CONCURRENT_INDEX_RE.match(code)
+    return match.group(1) if match else None
+
+
+async def invalid_indexes(conn: asyncpg.Connection, names: list[str]) -> list[str]:
+    """
+    Which of the given indexes are INVALID (left by failed concurrent builds).
+
+    Args:
+        names: Index names as written in SQL (optionally schema-qualified
+            or double-quoted); names that do not exist are ignored
+    """
+    rows = await conn.fetch("""
+        SELECT indexrelid::regclass::text AS name
+        FROM pg_index
+        WHERE NOT indisvalid
+          AND indexrelid IN (SELECT to_regclass(name) FROM unnest($1::text[]) AS name)
+        ORDER BY 1
+    """, names)
+    return [row["name"] for row in rows]
+
+
+async def drop_invalid_index(conn: asyncpg.Connection, name: str) -> bool:
+    """
+    Drop index `name` if it exists and is INVALID.
+
+    Returns:
+        True if an invalid index was dropped
+    """
+    valid = await conn.fetchval(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1)", name
+    )
+    if valid is None or valid:
+        return False
+    logger.warning(f"Dropping INVALID index {name} left by a failed concurrent build")
+    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    return True
+
+
+async def _with_lock_retries(coro_factory, description: str, retries: int) -> None:
+    """Run coro_factory(), retrying with backoff when lock_timeout fires"""
+    for attempt in range(1, retries + 1):
+        try:
+            await coro_factory()
+            return
+        except asyncpg.LockNotAvailableError:
+            if attempt == retries:
+                raise
+            delay = min(2 ** attempt, 30)
+            logger.warning(
+                f"{description}: lock_timeout hit "
+                f"(attempt {attempt}/{retries}), retrying in {delay}s"
+            )
+            await asyncio.sleep(delay)
+
+
+async def apply_migration(
+    conn: asyncpg.Connection,
+    migration: Migration,
+    lock_timeout: str = DEFAULT_LOCK_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+) -> None:
+    """
+    Apply a single migration and record it in schema_migrations.
+
+    Transactional migrations run as one transaction (retried as a whole).
+    Non-transactional migrations run statement by statement, each retried
+    on its own; they are recorded only after every statement succeeded and
+    none of the indexes they build concurrently is INVALID. Unnamed
+    concurrent indexes cannot be checked; name them.
+
+    Raises:
+        RuntimeError: If an index built by a no-transaction migration is
+            INVALID (the migration is not recorded)
+    """
+    timeout = migration.lock_timeout or lock_timeout
+    label = f"{migration.version}_{migration.name}"
+    record_sql = """
+        INSERT INTO schema_migrations (version, name, checksum)
+        VALUES ($1, $2, $3)
+    """
+
+    if migration.transactional:
+        async def run_transaction():
+            async with conn.transaction():
+                await conn.execute(f"SET LOCAL lock_timeout = '{timeout}'")
+                await conn.execute(migration.sql)
+                await conn.execute(
+                    record_sql, migration.version, migration.name, migration.checksum
+                )
+
+        await _with_lock_retries(run_transaction, label, retries)
+        return
+
+    await conn.execute(f"SET lock_timeout = '{timeout}'")
+    try:
+        index_names = []
+        for index, statement in enumerate(migration.statements, start=1):
+            index_name = concurrent_index_name(statement)
+            if index_name:
+                index_names.append(index_name)
+
+            async def run_statement(statement=statement, index_name=index_name):
+                # A failed earlier attempt (or run) may have left this index
+                # INVALID; IF NOT EXISTS would then skip rebuilding it
+                if index_name:
+                    await drop_invalid_index(conn, index_name)
+                await conn.execute(statement)
+
+            await _with_lock_retries(run_statement, f"{label} statement {index}", retries)
+
+        invalid = await invalid_indexes(conn, index_names) if index_names else []
+        if invalid:
+            raise RuntimeError(
+                f"{label}: INVALID indexes remain ({', '.join(invalid)}); "
+                f"not recording the migration. Drop them and re-run."
+            )
+        await conn.execute(
+            record_sql, migration.version, migration.name, migration.checksum
+        )
+    finally:
+        await conn.execute("RESET lock_timeout")
+
+
+async def maintain_partitions(
+    conn: asyncpg.Connection,
+    lock_timeout: str = DEFAULT_LOCK_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+) -> int:
+    """
+    Create the current and upcoming monthly events partitions.
+
+    Returns:
+        Number of partitions created
+    """
+    if await conn.fetchval("SELECT to_regclass($1)", events.EVENTS_TABLE) is None:
+        return 0
+
+    created = 0
+    for month in events.partition_months(datetime.now(timezone.utc)):
+        async def create(month=month):
+            nonlocal created
+            created += await events.ensure_partition(conn, month, lock_timeout)
+
+        await _with_lock_retries(create, f"partition {month:%Y_%m}", retries)
+    return created
+
+
+async def migrate(
+    dsn: str,
+    dry_run: bool = False,
+    status_only: bool = False,
+    lock_timeout: str = DEFAULT_LOCK_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+    partitions_only: bool = False,
+) -> int:
+    """
+    Apply pending migrations, then create upcoming events partitions.
+
+    Returns:
+        Number of migrations applied (or pending, for dry_run/status_only),
+        or of partitions created for partitions_only
+    """
+    migrations = load_migrations()
+    conn = await asyncpg.connect(dsn=dsn)
+    try:
+        await conn.execute("SELECT pg_advisory_lock($1)", ADVISORY_LOCK_KEY)
+        try:
+            if partitions_only:
+                return await maintain_partitions(conn, lock_timeout, retries)
+
+            await ensure_version_table(conn)
+            applied = await applied_versions(conn)
+
+            for migration in migrations:
+                checksum = applied.get(migration.version)
+                if checksum and checksum != migration.checksum:
+                    logger.warning(
+                        f"Migration {migration.path.name} changed after being applied"
+                    )
+
+            pending = [m for m in migrations if m.version not in applied]
+
+            if status_only:
+                for migration in migrations:
+                    state = "applied" if migration.version in applied else "pending"
+                    logger.info(f"{state:8} {migration.path.name}")
+                return len(pending)
+
+            for migration in pending:
+                mode = "transaction" if migration.transactional else "no-transaction"
+                if dry_run:
+                    logger.info(f"Would apply {migration.path.name} ({mode})")
+                    continue
+                logger.info(f"Applying {migration.path.name} ({mode})")
+                await apply_migration(conn, migration, lock_timeout, retries)
+
+            if dry_run:
+                if not pending:
+                    logger.info("Database schema is up to date")
+                return len(pending)
+            if pending:
+                logger.info(f"Applied {len(pending)} migration(s)")
+            else:
+                logger.info("Database schema is up to date")
+
+            await maintain_partitions(conn, lock_timeout, retries)
+            return len(pending)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", ADVISORY_LOCK_KEY)
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    parser = argparse.ArgumentParser(description="Apply TMA Studio database migrations")
+    parser.add_argument("--status", action="store_true", help="List applied/pending migrations")
+    parser.add_argument("--dry-run", action="store_true", help="Show pending migrations without applying")
+    parser.add_argument(
+        "--partitions",
+        action="store_true",
+        help="Only create upcoming events partitions (scheduled job)",
+    )
+    parser.add_argument(
+        "--lock-timeout",
+        default=DEFAULT_LOCK_TIMEOUT,
+        help=f"Postgres lock_timeout for DDL (default: {DEFAULT_LOCK_TIMEOUT})",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help=f"Attempts per step when lock_timeout fires (default: {DEFAULT_RETRIES})",
+    )
+    args = parser.parse_args()
+
+    load_dotenv()
+    dsn = getenv("DATABASE_URL")
+    if not dsn:
+        logger.error("DATABASE_URL environment variable is required")
+        sys.exit(1)
+
+    try:
+        asyncio.run(migrate(
+            dsn,
+            dry_run=args.dry_run,
+            status_only=args.status,
+            lock_timeout=args.lock_timeout,
+            retries=args.retries,
+            partitions_only=args.partitions,
+        ))
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,14 @@ Pydantic models for request/response validation.
 Uses Pydantic v2 for data validation and serialization.
 """
 
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Dict, List, Optional
+import json
+
+# Event payload limits: /api/events is public, and queued payloads are held
+# in worker memory until flushed (EVENTS_QUEUE_MAX_SIZE x 2 KiB = ~20 MiB)
+EVENT_PAYLOAD_MAX_BYTES = 2048
+EVENT_PAYLOAD_MAX_DEPTH = 4
 
 
 class AuthRequest(BaseModel):
@@ -34,8 +40,63 @@ class PreferencesModel(BaseModel):
     reduced_motion: bool = False
 
 
+class EventModel(BaseModel):
+    """Single activity event (e.g. app_open, theme_switch, demo_interaction)"""
+    type: str = Field(min_length=1, max_length=64)
+    payload: Optional[Dict[str, Any]] = None
+
+    @field_validator("payload")
+    @classmethod
+    def check_payload_size(cls, payload: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Reject payloads nested too deeply or larger than EVENT_PAYLOAD_MAX_BYTES as JSON"""
+        if payload is None:
+            return payload
+
+        # Depth first, iteratively, so json.dumps below never recurses deeply
+        stack = [(payload, 1)]
+        while stack:
+            value, depth = stack.pop()
+            if depth > EVENT_PAYLOAD_MAX_DEPTH:
+                raise ValueError(f"payload nesting exceeds {EVENT_PAYLOAD_MAX_DEPTH} levels")
+            children = value.values() if isinstance(value, dict) else value
+            stack.extend((child, depth + 1) for child in children if isinstance(child, (dict, list)))
+
+        size = len(json.dumps(payload, separators=(",", ":")).encode())
+        if size > EVENT_PAYLOAD_MAX_BYTES:
+            raise ValueError(f"payload exceeds {EVENT_PAYLOAD_MAX_BYTES} bytes ({size})")
+        return payload
+
+
+class EventBatchRequest(BaseModel):
+    """Request model for batched event ingestion"""
+    events: List[EventModel] = Field(min_length=1, max_length=100)
+
+
+class EventBatchResponse(BaseModel):
+    """Response model for batched event ingestion"""
+    accepted: int
+    dropped: int
+
+
+class EventStatsResponse(BaseModel):
+    """Per-worker event queue counters"""
+    queued: int
+    capacity: int
+    accepted: int
+    dropped: int
+    flushed: int
+    failed: int
+
+
 class HealthResponse(BaseModel):
     """Health check response model"""
     status: str
     database: Optional[str] = None
     error: Optional[str] = None
+
+
+class ReadinessResponse(BaseModel):
+    """Worker readiness response model"""
+    status: str
+    pid: int
+    startup_ms: Dict[str, float]
@@ -0,0 +1,469 @@
+"""
+Opt-in sampling profiler and slow-request capture.
+
+A single daemon thread per worker samples the event loop thread's stack
+every PROFILING_SAMPLE_INTERVAL_MS (sys._current_frames, no tracing hooks).
+Samples are used for two things:
+
+- On-demand profiles (/api/admin/profile): every sample is counted into a
+  collapsed-stack Counter ("frame;frame;frame count" lines), ready for
+  flamegraph.pl / speedscope.
+- Slow-request capture (SlowRequestMiddleware): samples taken while a
+  request's task is running on the loop are attributed to that request.
+  asyncpg query logger callbacks add DB query spans. Requests slower than
+  SLOW_REQUEST_THRESHOLD_MS are kept in a bounded ring buffer.
+
+The sampler skips the stack walk entirely when no request is in flight and
+no profile is running, so idle overhead is a timer wake-up per interval.
+Counters written by the sampler thread change hands under a lock: once a
+trace or profile has been handed over it is never written again, so it
+can be iterated safely.
+
+Sampling state is per uvicorn worker process: each worker samples itself
+and keeps its own ring buffer. Workers coordinate through PROFILE_DIR, a
+directory shared by all workers that each sampler thread polls every
+POLL_INTERVAL seconds:
+
+- <id>.request: written by the worker serving /api/admin/profile. Every
+  worker (or only the one whose pid it names) samples itself until the
+  request's deadline and writes <id>.<pid>.collapsed; the serving worker
+  merges those into one profile.
+- slow.<pid>.json: each worker's slow-request ring buffer, rewritten
+  after new captures, so /api/admin/slow-requests can return all workers'.
+
+Lifecycle (called by main.py lifespan):
+- start_profiler(...) on startup
+- stop_profiler() on shutdown
+"""
+
+import asyncio
+import contextvars
+import glob
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from typing import Optional
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MAX_STACK_DEPTH = 128
+MAX_DB_SPANS = 200
+MAX_QUERY_LENGTH = 200
+TOP_STACKS = 20
+
+# PROFILE_DIR poll period of each sampler thread, and how long the
+# collecting worker waits past a profile's deadline for the other workers
+POLL_INTERVAL = 0.25
+COLLECT_GRACE = 1.0
+
+
+def _write_atomic(path: str, data: str) -> None:
+    """Write via temp file + rename so pollers never read a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp.")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class RequestTrace:
+    """Timing data collected for one in-flight request"""
+
+    __slots__ = ("method", "path", "status", "started", "started_at", "samples", "db_spans")
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.status: Optional[int] = None
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.samples: Counter = Counter()
+        self.db_spans: list[dict] = []
+
+    def to_dict(self, duration_ms: float, sample_interval_ms: float) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(duration_ms, 1),
+            # On-loop CPU time attributed to this request (samples x interval)
+            "sampled_cpu_ms": round(sum(self.samples.values()) * sample_interval_ms, 1),
+            "stacks": [
+                f"{stack} {count}"
+                for stack, count in self.samples.most_common(TOP_STACKS)
+            ],
+            "db_spans": self.db_spans,
+            "pid": os.getpid(),
+        }
+
+
+_current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+
+
+class Profiler:
+    """Per-worker stack sampler, profile sessions and slow-request buffer"""
+
+    def __init__(
+        self,
+        profile_dir: str,
+        sample_interval_ms: float = 10.0,
+        slow_threshold_ms: int = 500,
+        buffer_size: int = 100,
+    ):
+        self.profile_dir = profile_dir
+        self.sample_interval_ms = sample_interval_ms
+        self.slow_threshold_ms = slow_threshold_ms
+        self.slow_requests: deque = deque(maxlen=buffer_size)
+        self._slow_dirty = False
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        # Guards _active, _profile and the Counters reachable from them
+        self._lock = threading.Lock()
+        self._active: dict[asyncio.Task, RequestTrace] = {}
+        self._profile: Optional[Counter] = None
+        self._labels: dict = {}
+
+        # Profile request being served by this worker: (id, deadline);
+        # requests already seen: id -> deadline (sampler thread only)
+        self._request: Optional[tuple[str, float]] = None
+        self._seen: dict[str, float] = {}
+
+    # Sampler thread
+
+    def start(self) -> None:
+        """Start sampling the current thread's event loop"""
+        os.makedirs(self.profile_dir, exist_ok=True)
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+        try:
+            os.unlink(self._slow_path(os.getpid()))
+        except FileNotFoundError:
+            pass
+
+    def _run(self) -> None:
+        interval = self.sample_interval_ms / 1000
+        next_poll = 0.0
+        while not self._stopped.wait(interval):
+            if time.monotonic() >= next_poll:
+                next_poll = time.monotonic() + POLL_INTERVAL
+                try:
+                    self._poll()
+                except Exception as e:
+                    logger.warning(f"Profile directory poll failed: {e}")
+
+            if not self._active and self._profile is None:
+                continue
+            try:
+                self._sample()
+            except Exception as e:
+                # Never let a sampling glitch kill the thread
+                logger.debug(f"Sampling failed: {e}")
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = self._collapse(frame)
+        # Reads the loop's current task from another thread; a stale read
+        # only misattributes a single sample
+        task = asyncio.current_task(self._loop) if self._active else None
+
+        with self._lock:
+            if self._profile is not None:
+                self._profile[stack] += 1
+            trace = self._active.get(task) if task is not None else None
+            if trace is not None:
+                trace.samples[stack] += 1
+
+    def _collapse(self, frame) -> str:
+        labels = self._labels
+        parts = []
+        while frame is not None and len(parts) < MAX_STACK_DEPTH:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                name = getattr(code, "co_qualname", code.co_name)
+                label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                labels[code] = label
+            parts.append(label)
+            frame = frame.f_back
+        parts.reverse()
+        return ";".join(parts)
+
+    # PROFILE_DIR coordination (sampler thread)
+
+    def _poll(self) -> None:
+        now = time.time()
+        pid = os.getpid()
+
+        if self._request is not None and now >= self._request[1]:
+            request_id = self._request[0]
+            with self._lock:
+                profile, self._profile = self._profile, None
+            self._request = None
+            _write_atomic(
+                os.path.join(self.profile_dir, f"{request_id}.{pid}.collapsed"),
+                "".join(f"{stack} {count}\n" for stack, count in profile.items()),
+            )
+
+        if self._request is None:
+            for path in glob.glob(os.path.join(self.profile_dir, "*.request")):
+                request_id = os.path.basename(path)[:-len(".request")]
+                if request_id in self._seen:
+                    continue
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        request = json.load(f)
+                except (OSError, ValueError):
+                    # Removed by its collector between glob and open
+                    continue
+                self._seen[request_id] = request["deadline"]
+                if request["deadline"] > now and request.get("pid") in (None, pid):
+                    self._request = (request_id, request["deadline"])
+                    with self._lock:
+                        self._profile = Counter()
+                    break
+
+        self._seen = {key: deadline for key, deadline in self._seen.items() if deadline > now}
+
+        if self._slow_dirty:
+            self._slow_dirty = False
+            with self._lock:
+                entries = list(self.slow_requests)
+            _write_atomic(self._slow_path(pid), json.dumps(entries))
+
+    def _slow_path(self, pid: int) -> str:
+        return os.path.join(self.profile_dir, f"slow.{pid}.json")
+
+    # On-demand profiles (any worker, async)
+
+    async def collect_profile(self, seconds: float, pid: Optional[int] = None) -> tuple[Counter, list[int]]:
+        """
+        Profile all workers (or only worker `pid`) for `seconds`.
+
+        Returns:
+            (merged collapsed stack counts, pids of the workers that reported)
+
+        Raises:
+            RuntimeError: If a profile is already running
+        """
+        now = time.time()
+        for path in glob.glob(os.path.join(self.profile_dir, "*.request")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    running = json.load(f)["deadline"] + COLLECT_GRACE > now
+            except (OSError, ValueError, KeyError):
+                continue
+            if running:
+                raise RuntimeError("Profile already running")
+            # Left behind by a collector that died mid-profile
+            os.unlink(path)
+        # Results that arrived after their collector gave up
+        for path in glob.glob(os.path.join(self.profile_dir, "*.collapsed")):
+            os.unlink(path)
+
+        request_id = uuid.uuid4().hex
+        request_path = os.path.join(self.profile_dir, f"{request_id}.request")
+        deadline = now + seconds
+        _write_atomic(request_path, json.dumps({"deadline": deadline, "pid": pid}))
+
+        try:
+            await asyncio.sleep(seconds + COLLECT_GRACE)
+
+            merged: Counter = Counter()
+            pids = []
+            for path in glob.glob(os.path.join(self.profile_dir, f"{request_id}.*.collapsed")):
+                pids.append(int(path.rsplit(".", 2)[1]))
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        stack, _, count = line.rstrip("\n").rpartition(" ")
+                        if stack:
+                            merged[stack] += int(count)
+                os.unlink(path)
+            return merged, sorted(pids)
+        finally:
+            os.unlink(request_path)
+
+    def all_slow_requests(self) -> list[dict]:
+        """Slow requests captured by all live workers, newest first"""
+        own_pid = os.getpid()
+        with self._lock:
+            entries = list(self.slow_requests)
+
+        for path in glob.glob(os.path.join(self.profile_dir, "slow.*.json")):
+            pid = int(path.rsplit(".", 2)[1])
+            if pid == own_pid:
+                continue
+            if not _pid_alive(pid):
+                # Left behind by a worker that was killed
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entries.extend(json.load(f))
+            except (OSError, ValueError):
+                continue
+
+        entries.sort(key=lambda entry: entry["started_at"], reverse=True)
+        return entries
+
+    # Slow-request capture
+
+    def begin_request(self, task: asyncio.Task, trace: RequestTrace) -> None:
+        with self._lock:
+            self._active[task] = trace
+
+    def end_request(self, task: asyncio.Task, trace: RequestTrace) -> None:
+        # After the pop under the lock the sampler can no longer reach
+        # trace.samples, so to_dict() iterates a quiescent Counter
+        with self._lock:
+            self._active.pop(task, None)
+        duration_ms = (time.perf_counter() - trace.started) * 1000
+        if duration_ms >= self.slow_threshold_ms:
+            entry = trace.to_dict(duration_ms, self.sample_interval_ms)
+            with self._lock:
+                self.slow_requests.append(entry)
+            self._slow_dirty = True
+
+
+def _log_query(record) -> None:
+    """asyncpg query logger: attach a DB span to the current request"""
+    trace = _current_trace.get()
+    if trace is None or len(trace.db_spans) >= MAX_DB_SPANS:
+        return
+    elapsed_ms = record.elapsed * 1000
+    offset_ms = (time.perf_counter() - trace.started) * 1000 - elapsed_ms
+    trace.db_spans.append({
+        "query": " ".join(record.query.split())[:MAX_QUERY_LENGTH],
+        "start_ms": round(max(offset_ms, 0), 1),
+        "elapsed_ms": round(elapsed_ms, 2),
+        "error": repr(record.exception) if record.exception else None,
+    })
+
+
+async def instrument_connection(conn: asyncpg.Connection) -> None:
+    """
+    Pool init hook: record query spans for slow-request capture.
+
+    asyncpg schedules logger callbacks with call_soon, which copies the
+    caller's context, so _current_trace resolves to the issuing request.
+    """
+    conn.add_query_logger(_log_query)
+
+
+class SlowRequestMiddleware:
+    """
+    Pure ASGI middleware that traces each HTTP request for the profiler.
+
+    Pass-through when the profiler is not running.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        profiler = _profiler
+        if profiler is None or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(scope["method"], scope["path"])
+        task = asyncio.current_task()
+        token = _current_trace.set(trace)
+        profiler.begin_request(task, trace)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.end_request(task, trace)
+            _current_trace.reset(token)
+
+
+# Global profiler (initialized in main.py lifespan when PROFILING_ENABLED)
+_profiler: Optional[Profiler] = None
+
+
+def get_profiler() -> Profiler:
+    """
+    Dependency for the profiler.
+
+    Returns:
+        Profiler: Per-worker profiler
+
+    Raises:
+        RuntimeError: If profiling is not enabled
+    """
+    if _profiler is None:
+        raise RuntimeError("Profiler not initialized")
+    return _profiler
+
+
+def start_profiler(**kwargs) -> Profiler:
+    """
+    Create the global profiler and start its sampler thread.
+
+    Called by main.py during lifespan startup (from the event loop thread).
+
+    Args:
+        **kwargs: Profiler tuning options
+    """
+    global _profiler
+    _profiler = Profiler(**kwargs)
+    _profiler.start()
+    return _profiler
+
+
+def stop_profiler() -> None:
+    """
+    Stop the global profiler's sampler thread.
+
+    Called by main.py during lifespan shutdown.
+    """
+    global _profiler
+    if _profiler:
+        _profiler.stop()
+        _profiler = None
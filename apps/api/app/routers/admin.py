@@ -0,0 +1,113 @@
+"""
+Admin router for production profiling and internal counters.
+
+Only mounted when ADMIN_TOKEN is set. Every endpoint requires the
+X-Admin-Token header to match it. The profiling endpoints return 404
+unless PROFILING_ENABLED is also true.
+
+Profiles and slow requests cover all workers: they coordinate through
+PROFILE_DIR (see app/profiling.py). The X-Worker-Pids header lists the
+workers included.
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import hmac
+import logging
+import os
+
+from app.config import get_settings
+from app.events import EventQueue, get_event_queue
+from app.models import EventStatsResponse
+from app.profiling import Profiler, get_profiler
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """
+    Dependency: reject requests without a valid admin token.
+
+    Raises:
+        HTTPException: 401 if the token is missing or does not match
+    """
+    expected = get_settings().ADMIN_TOKEN
+    if not expected or not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=401, detail="Not authorized")
+
+
+def require_profiler() -> Profiler:
+    """
+    Dependency: the worker's profiler.
+
+    Raises:
+        HTTPException: 404 if PROFILING_ENABLED is false
+    """
+    if not get_settings().PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return get_profiler()
+
+
+@router.post("/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+async def profile_workers(
+    seconds: float = Query(10, gt=0),
+    pid: Optional[int] = Query(None, description="Profile only this worker"),
+    profiler: Profiler = Depends(require_profiler)
+) -> PlainTextResponse:
+    """
+    Sample all workers (or only `pid`) for `seconds` and return merged
+    collapsed stacks.
+
+    Output is one "frame;frame;frame count" line per unique stack, ready
+    for flamegraph.pl or speedscope. Returns 409 if a profile is already
+    running, 503 if no worker reported.
+    """
+    max_seconds = get_settings().PROFILE_MAX_SECONDS
+    if seconds > max_seconds:
+        raise HTTPException(status_code=400, detail=f"seconds must be <= {max_seconds}")
+
+    try:
+        stacks, pids = await profiler.collect_profile(seconds, pid)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if not pids:
+        raise HTTPException(status_code=503, detail="No worker reported a profile")
+
+    logger.info(f"Profiled workers {pids} for {seconds}s ({sum(stacks.values())} samples)")
+
+    body = "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+    return PlainTextResponse(body, headers={"X-Worker-Pids": ",".join(map(str, pids))})
+
+
+@router.get("/slow-requests", dependencies=[Depends(require_admin)])
+async def slow_requests(
+    response: Response,
+    profiler: Profiler = Depends(require_profiler)
+) -> list[dict]:
+    """
+    Return the slow requests captured by all workers, newest first.
+
+    Each entry has the request duration, sampled on-loop stacks (collapsed),
+    the DB query spans issued while handling it and the worker pid. Other
+    workers' captures are up to POLL_INTERVAL old.
+    """
+    entries = profiler.all_slow_requests()
+    response.headers["X-Worker-Pids"] = ",".join(sorted({str(entry["pid"]) for entry in entries}))
+    return entries
+
+
+@router.get("/events/stats", response_model=EventStatsResponse, dependencies=[Depends(require_admin)])
+async def event_stats(
+    response: Response,
+    queue: EventQueue = Depends(get_event_queue)
+) -> EventStatsResponse:
+    """
+    Queue depth and drop counters for the worker that served the request.
+
+    Note: counters are per uvicorn worker, not aggregated.
+    """
+    response.headers["X-Worker-Pid"] = str(os.getpid())
+    return EventStatsResponse(**queue.stats())
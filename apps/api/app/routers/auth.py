@@ -6,6 +6,7 @@ Source: https://core.telegram.org/bots/webapps#validating-data-received-via-the-
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Response
+from typing import Optional
 import hmac
 import hashlib
 from urllib.parse import parse_qsl
@@ -14,8 +15,9 @@ import asyncpg
 import json
 import logging
 
-from app.config import settings
+from app.config import get_settings
 from app.database import get_db_pool
+from app.user_directory import UserDirectory, get_user_directory
 from app.auth import create_access_token
 from app.models import AuthRequest, AuthResponse, UserInfo
 
@@ -102,11 +104,34 @@ def validate_init_data(init_data: str, bot_token: str, max_age_seconds: int = 86
         raise ValueError(f"Validation failed: {str(e)}")
 
 
+async def _upsert_user(
+    pool: asyncpg.Pool,
+    telegram_id: int,
+    first_name: Optional[str],
+    last_name: Optional[str],
+    username: Optional[str]
+) -> dict:
+    """Insert or update a user and return its row"""
+    async with pool.acquire() as conn:
+        user = await conn.fetchrow("""
+            INSERT INTO users (telegram_id, first_name, last_name, username)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (telegram_id) DO UPDATE
+            SET first_name = EXCLUDED.first_name,
+                last_name = EXCLUDED.last_name,
+                username = EXCLUDED.username,
+                updated_at = NOW()
+            RETURNING id, telegram_id, first_name, last_name, username
+        """, telegram_id, first_name, last_name, username)
+    return dict(user)
+
+
 @router.post("/validate", response_model=AuthResponse)
 async def validate_auth(
     request: AuthRequest,
     response: Response,
-    pool: asyncpg.Pool = Depends(get_db_pool)
+    pool: asyncpg.Pool = Depends(get_db_pool),
+    directory: Optional[UserDirectory] = Depends(get_user_directory)
 ) -> AuthResponse:
     """
     Validate Telegram initData and set session cookie.
@@ -114,7 +139,8 @@ async def validate_auth(
     Steps:
     1. Validate initData HMAC
     2. Parse user data
-    3. Upsert user in database
+    3. Upsert user in database (skipped for returning users with an
+       unchanged profile when the user directory is enabled)
     4. Generate JWT token
     5. Set HttpOnly cookie
     6. Return user info
@@ -122,6 +148,8 @@ async def validate_auth(
     Source: FastAPI cookie documentation
     Verified: response.set_cookie() with httponly, secure, samesite parameters
     """
+    settings = get_settings()
+    
     try:
         # Validate initData with configurable TTL
         validated_data = validate_init_data(
@@ -138,19 +166,27 @@ async def validate_auth(
         if not telegram_id:
             raise HTTPException(status_code=400, detail="No user ID in initData")
         
-        # Upsert user in database
-        async with pool.acquire() as conn:
-            user = await conn.fetchrow("""
-                INSERT INTO users (telegram_id, first_name, last_name, username)
-                VALUES ($1, $2, $3, $4)
-                ON CONFLICT (telegram_id) DO UPDATE
-                SET first_name = EXCLUDED.first_name,
-                    last_name = EXCLUDED.last_name,
-                    username = EXCLUDED.username,
-                    updated_at = NOW()
-                RETURNING id, telegram_id, first_name, last_name, username
-            """, telegram_id, user_data.get('first_name'), 
-                user_data.get('last_name'), user_data.get('username'))
+        first_name = user_data.get('first_name')
+        last_name = user_data.get('last_name')
+        username = user_data.get('username')
+        
+        # Returning user with unchanged profile: nothing to write
+        user_id = None
+        if directory is not None:
+            user_id = directory.lookup_unchanged(telegram_id, first_name, last_name, username)
+        
+        if user_id is not None:
+            user = {
+                "id": user_id,
+                "telegram_id": telegram_id,
+                "first_name": first_name,
+                "last_name": last_name,
+                "username": username,
+            }
+        else:
+            user = await _upsert_user(pool, telegram_id, first_name, last_name, username)
+            if directory is not None:
+                directory.put(user['id'], telegram_id, first_name, last_name, username)
         
         # Generate JWT token
         token_data = {
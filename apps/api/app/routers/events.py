@@ -0,0 +1,93 @@
+"""
+Events router for batched Mini App activity tracking.
+
+Events are queued in memory and written in batches by the flusher in
+app/events.py; this endpoint never touches the database directly.
+Authentication is optional: events are attributed to the user when a
+valid session cookie is present, otherwise stored anonymously. Because
+the endpoint is public, request bodies are capped at MAX_BODY_BYTES
+(checked from Content-Length before the body is read) and each payload
+at EVENT_PAYLOAD_MAX_BYTES (see app/models.py). Request rate per client
+IP is limited by nginx (limit_req zone tma_events in
+deploy/nginx/tma-studio-api.conf), not here.
+"""
+
+from fastapi import APIRouter, HTTPException, Depends, Cookie, Request
+from fastapi.routing import APIRoute
+from typing import Callable, Optional
+import logging
+
+from app.auth import extract_user_id_from_cookie
+from app.events import EventQueue, get_event_queue, make_record
+from app.models import EventBatchRequest, EventBatchResponse
+
+logger = logging.getLogger(__name__)
+
+# 100 events x 2 KiB payloads + envelope; browsers cap keepalive fetch
+# bodies at 64 KiB anyway
+MAX_BODY_BYTES = 128 * 1024
+
+
+class LimitedBodyRoute(APIRoute):
+    """
+    Route that checks Content-Length before the body is read.
+
+    FastAPI reads and parses the body before running dependencies, so the
+    check has to wrap the route handler itself.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def limited_handler(request: Request):
+            if request.method in ("POST", "PUT", "PATCH"):
+                content_length = request.headers.get("content-length")
+                if content_length is None or not content_length.isdigit():
+                    raise HTTPException(status_code=411, detail="Content-Length required")
+                if int(content_length) > MAX_BODY_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Body exceeds {MAX_BODY_BYTES} bytes")
+            return await handler(request)
+
+        return limited_handler
+
+
+router = APIRouter(route_class=LimitedBodyRoute)
+
+
+@router.post("", response_model=EventBatchResponse, status_code=202)
+async def ingest_events(
+    batch: EventBatchRequest,
+    session: Optional[str] = Cookie(None),
+    queue: EventQueue = Depends(get_event_queue)
+) -> EventBatchResponse:
+    """
+    Accept a batch of events for asynchronous storage.
+
+    Returns 202 with accepted/dropped counts. When the queue is full and
+    nothing could be accepted, returns 429 with Retry-After so clients
+    back off instead of retrying immediately.
+    """
+    user_id = None
+    if session:
+        try:
+            user_id = extract_user_id_from_cookie(session)
+        except ValueError:
+            # Expired/invalid session: keep the events, drop attribution
+            pass
+
+    records = [
+        make_record(event.type, event.payload, user_id)
+        for event in batch.events
+    ]
+    accepted = queue.offer(records)
+    dropped = len(records) - accepted
+
+    if accepted == 0:
+        logger.warning(f"Event queue full, rejected batch of {len(records)}")
+        raise HTTPException(
+            status_code=429,
+            detail="Event queue full",
+            headers={"Retry-After": "5"},
+        )
+
+    return EventBatchResponse(accepted=accepted, dropped=dropped)
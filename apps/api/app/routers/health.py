@@ -1,16 +1,18 @@
 """
 Health check router for monitoring.
 
-Provides a simple health check endpoint that verifies database connectivity.
-No authentication required.
+Provides a simple health check endpoint that verifies database connectivity,
+and a readiness endpoint for deploy scripts. No authentication required.
 """
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 import asyncpg
 import logging
+import os
 
+from app import startup
 from app.database import get_db_pool
-from app.models import HealthResponse
+from app.models import HealthResponse, ReadinessResponse
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -35,3 +37,25 @@ async def health_check(pool: asyncpg.Pool = Depends(get_db_pool)) -> HealthRespo
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         return HealthResponse(status="unhealthy", error=str(e))
+
+
+@router.get("/ready", response_model=ReadinessResponse)
+async def readiness_check(response: Response) -> ReadinessResponse:
+    """
+    Readiness endpoint - no authentication required.
+    
+    Returns 200 once the serving worker has finished startup (pool created
+    and warmed up), 503 while it is shutting down. Does not hit the
+    database, so it is cheap enough for tight polling by deploy scripts.
+    
+    Returns:
+        ReadinessResponse with worker pid and startup phase timings
+    """
+    ready = startup.is_ready()
+    if not ready:
+        response.status_code = 503
+    return ReadinessResponse(
+        status="ready" if ready else "not_ready",
+        pid=os.getpid(),
+        startup_ms=startup.timings(),
+    )
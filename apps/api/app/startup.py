@@ -0,0 +1,59 @@
+"""
+Worker startup instrumentation and readiness state.
+
+main.py imports this module before anything else so the clock covers the
+import phase. Phases are recorded as durations and logged once the worker
+is ready; /api/ready exposes them together with the readiness flag.
+
+Readiness is per worker process: uvicorn only starts accepting connections
+in a worker after lifespan startup (pool creation + warm-up) completes, and
+the flag is cleared again as soon as shutdown begins.
+"""
+
+import logging
+import time
+from typing import Awaitable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_started = time.perf_counter()
+_last_mark = _started
+_phases: dict[str, float] = {}
+_ready = False
+
+
+def mark(phase: str) -> None:
+    """Record the time since the previous mark as `phase`"""
+    global _last_mark
+    now = time.perf_counter()
+    _phases[phase] = round((now - _last_mark) * 1000, 1)
+    _last_mark = now
+
+
+async def timed(phase: str, awaitable: Awaitable[T]) -> T:
+    """Await and record the duration as `phase` (for concurrent steps)"""
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        _phases[phase] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def timings() -> dict[str, float]:
+    """Recorded phase durations in milliseconds, plus total since import"""
+    return {**_phases, "total": round((_last_mark - _started) * 1000, 1)}
+
+
+def set_ready(ready: bool = True, logger: Optional[logging.Logger] = None) -> None:
+    """Mark this worker ready (or not ready, during shutdown)"""
+    global _ready
+    _ready = ready
+    if ready:
+        mark("lifespan")
+        if logger:
+            summary = " ".join(f"{k}={v}ms" for k, v in timings().items())
+            logger.info(f"Worker ready: {summary}")
+
+
+def is_ready() -> bool:
+    return _ready
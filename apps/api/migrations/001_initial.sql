@@ -14,8 +14,8 @@ CREATE TABLE IF NOT EXISTS users (
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
--- Index on telegram_id for fast lookups during authentication
-CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
+-- telegram_id lookups during authentication use the UNIQUE index
+-- (a separate idx_users_telegram_id would be redundant, see 003)
 
 -- User preferences table
 -- Stores user-specific preferences (theme, accessibility)
@@ -29,5 +29,5 @@ CREATE TABLE IF NOT EXISTS user_preferences (
     UNIQUE(user_id)
 );
 
--- Index on user_id for fast preference lookups
-CREATE INDEX IF NOT EXISTS idx_user_preferences_user_id ON user_preferences(user_id);
+-- user_id lookups use the UNIQUE(user_id) index
+-- (a separate idx_user_preferences_user_id would be redundant, see 003)
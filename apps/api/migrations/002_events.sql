@@ -0,0 +1,23 @@
+-- apps/api/migrations/002_events.sql
+-- Activity events table for Mini App usage tracking
+-- Written in batches by the API event flusher (app/events.py) via COPY
+
+-- Events table, range-partitioned by month on created_at
+-- Partitioning keeps inserts on a small, hot partition and lets old months
+-- be detached/dropped without a bulk DELETE.
+-- No primary key / foreign keys: COPY throughput matters more than
+-- referential integrity for append-only analytics data.
+CREATE TABLE IF NOT EXISTS events (
+    created_at TIMESTAMPTZ NOT NULL,
+    user_id INTEGER,
+    event_type VARCHAR(64) NOT NULL,
+    payload JSONB
+) PARTITION BY RANGE (created_at);
+
+-- Catch-all partition for rows outside any monthly partition
+-- Monthly partitions are created ahead of time by app.migrate (see
+-- ensure_partition in app/events.py and tma-studio-partitions.timer)
+CREATE TABLE IF NOT EXISTS events_default PARTITION OF events DEFAULT;
+
+-- BRIN index: tiny and cheap to maintain for append-only, time-ordered data
+CREATE INDEX IF NOT EXISTS idx_events_created_at ON events USING BRIN (created_at);
@@ -0,0 +1,15 @@
+-- migrate: no-transaction
+-- apps/api/migrations/003_drop_duplicate_indexes.sql
+-- Drop indexes that duplicate UNIQUE constraint indexes from 001_initial.sql
+--
+-- users.telegram_id and user_preferences.user_id are already covered by the
+-- btree indexes backing their UNIQUE constraints (users_telegram_id_key,
+-- user_preferences_user_id_key). The extra indexes only double index
+-- maintenance on every login upsert and preference upsert.
+--
+-- DROP INDEX CONCURRENTLY avoids taking an ACCESS EXCLUSIVE lock on the
+-- hot tables; it cannot run inside a transaction block.
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_users_telegram_id;
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_user_preferences_user_id;
@@ -0,0 +1,12 @@
+-- migrate: no-transaction
+-- apps/api/migrations/004_users_updated_at_index.sql
+-- Index for the user directory change feed (app/user_directory.py)
+--
+-- Each API worker pages through users WHERE (updated_at, id) > <cursor>
+-- ORDER BY updated_at, id; without a matching index that is a sequential
+-- scan of users every few seconds per worker.
+-- Built CONCURRENTLY so the users table stays writable during the build.
+-- A failed build leaves an INVALID index; app.migrate drops it before
+-- retrying and never records this migration while it remains.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_updated_at_id ON users(updated_at, id);
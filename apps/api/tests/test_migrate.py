@@ -0,0 +1,100 @@
+"""Tests for migration parsing (app/migrate.py); no database needed"""
+
+import pytest
+
+from app.migrate import concurrent_index_name, parse_migration, split_statements
+
+
+def test_split_statements_on_top_level_semicolons():
+    assert split_statements("SELECT 1; SELECT 2;\n") == ["SELECT 1", "SELECT 2"]
+
+
+def test_split_statements_keeps_quoted_semicolons():
+    sql = "INSERT INTO t VALUES ('a;b'); CREATE TABLE \"odd;name\" (id int);"
+    assert split_statements(sql) == [
+        "INSERT INTO t VALUES ('a;b')",
+        'CREATE TABLE "odd;name" (id int)',
+    ]
+
+
+def test_split_statements_doubled_quotes():
+    sql = "SELECT 'it''s; fine'; SELECT \"a\"\"b;\" FROM t;"
+    assert split_statements(sql) == [
+        "SELECT 'it''s; fine'",
+        'SELECT "a""b;" FROM t',
+    ]
+
+
+def test_split_statements_dollar_quoted_bodies():
+    sql = (
+        "CREATE FUNCTION f() RETURNS void AS $body$ BEGIN PERFORM 1; END; $body$ LANGUAGE plpgsql;\n"
+        "DO $$ BEGIN PERFORM 2; END $$;"
+    )
+    assert split_statements(sql) == [
+        "CREATE FUNCTION f() RETURNS void AS $body$ BEGIN PERFORM 1; END; $body$ LANGUAGE plpgsql",
+        "DO $$ BEGIN PERFORM 2; END $$",
+    ]
+
+
+def test_split_statements_comments():
+    sql = (
+        "-- header; not a statement\n"
+        "SELECT 1; -- trailing; comment\n"
+        "-- only a comment;\n"
+    )
+    # Comments stay with the following statement; comment-only ones are dropped
+    assert split_statements(sql) == ["-- header; not a statement\nSELECT 1"]
+
+
+def write_migration(tmp_path, name, sql):
+    path = tmp_path / name
+    path.write_text(sql, encoding="utf-8")
+    return path
+
+
+def test_parse_migration_defaults(tmp_path):
+    migration = parse_migration(write_migration(tmp_path, "001_init.sql", "CREATE TABLE t (id int);\n"))
+    assert (migration.version, migration.name) == ("001", "init")
+    assert migration.transactional
+    assert migration.lock_timeout is None
+    assert migration.statements == []
+
+
+def test_parse_migration_directives(tmp_path):
+    sql = (
+        "-- Add an index\n"
+        "-- migrate: no-transaction, lock_timeout=10s\n"
+        "\n"
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_t_id ON t(id);\n"
+        "-- migrate: lock_timeout=1s\n"
+    )
+    migration = parse_migration(write_migration(tmp_path, "002_index.sql", sql))
+    assert not migration.transactional
+    assert migration.lock_timeout == "10s"
+    assert len(migration.statements) == 1
+    assert concurrent_index_name(migration.statements[0]) == "idx_t_id"
+
+
+def test_parse_migration_unknown_directive(tmp_path):
+    path = write_migration(tmp_path, "003_bad.sql", "-- migrate: fast\nSELECT 1;\n")
+    with pytest.raises(ValueError, match="unknown directive"):
+        parse_migration(path)
+
+
+def test_parse_migration_invalid_filename(tmp_path):
+    with pytest.raises(ValueError, match="Invalid migration filename"):
+        parse_migration(write_migration(tmp_path, "init.sql", "SELECT 1;\n"))
+
+
+@pytest.mark.parametrize("statement, name", [
+    ("CREATE INDEX CONCURRENTLY idx_a ON t(a)", "idx_a"),
+    ("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_a ON t(a)", "idx_a"),
+    ("create unique index concurrently if not exists public.idx_a on t(a)", "public.idx_a"),
+    ('CREATE INDEX CONCURRENTLY "Idx A" ON t(a)', '"Idx A"'),
+    ("-- build it\nCREATE INDEX CONCURRENTLY idx_a -- name\nON t(a)", "idx_a"),
+    ("CREATE INDEX CONCURRENTLY ON t(a)", None),
+    ("CREATE INDEX idx_a ON t(a)", None),
+    ("ALTER TABLE t ADD COLUMN a int", None),
+])
+def test_concurrent_index_name(statement, name):
+    assert concurrent_index_name(statement) == name
@@ -0,0 +1,84 @@
+"""Tests for the in-process user directory (app/user_directory.py)"""
+
+import asyncio
+
+from app.user_directory import UserDirectory, fingerprint, write_snapshot
+
+
+def test_put_and_lookup():
+    directory = UserDirectory()
+    directory.put(1, 1001, "Ann", None, "ann")
+
+    assert directory.get(1001) == (1, fingerprint("Ann", None, "ann"))
+    assert directory.lookup_unchanged(1001, "Ann", None, "ann") == 1
+    assert directory.lookup_unchanged(1001, "Ann", "Lee", "ann") is None
+    assert directory.lookup_unchanged(1002, "Ann", None, "ann") is None
+    assert len(directory) == 1
+
+
+def test_snapshot_round_trip(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+    entries = [(tg, fingerprint(f"User {tg}", None, None), tg - 1000) for tg in (1003, 1001, 1002)]
+    assert write_snapshot(path, entries, (123, 7)) == 3
+
+    directory = UserDirectory()
+    directory.load_snapshot(path)
+    try:
+        assert len(directory) == 3
+        assert directory.watermark == (123, 7)
+        for tg in (1001, 1002, 1003):
+            assert directory.lookup_unchanged(tg, f"User {tg}", None, None) == tg - 1000
+        assert directory.get(1004) is None
+        assert directory.pending_changes == 0
+    finally:
+        directory.close()
+
+
+def test_put_matching_snapshot_is_not_pending(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+    write_snapshot(path, [(1001, fingerprint("Ann", None, None), 1)], (0, 0))
+    directory = UserDirectory()
+    directory.load_snapshot(path)
+    try:
+        directory.put(1, 1001, "Ann", None, None)
+        assert directory.pending_changes == 0
+        directory.put(1, 1001, "Anna", None, None)
+        assert directory.pending_changes == 1
+        assert directory.lookup_unchanged(1001, "Anna", None, None) == 1
+    finally:
+        directory.close()
+
+
+def test_save_snapshot_folds_changes(tmp_path):
+    path = str(tmp_path / "users.snapshot")
+    write_snapshot(path, [(1001, fingerprint("Ann", None, None), 1)], (0, 0))
+    directory = UserDirectory()
+    directory.load_snapshot(path)
+    try:
+        directory.put(1, 1001, "Anna", None, None)
+        directory.put(2, 1002, "Bob", None, None)
+        directory.watermark = (500, 2)
+
+        assert asyncio.run(directory.save_snapshot(path)) == 2
+        assert directory.pending_changes == 0
+
+        reloaded = UserDirectory()
+        reloaded.load_snapshot(path)
+        assert reloaded.watermark == (500, 2)
+        assert reloaded.lookup_unchanged(1001, "Anna", None, None) == 1
+        assert reloaded.lookup_unchanged(1002, "Bob", None, None) == 2
+        reloaded.close()
+    finally:
+        directory.close()
+
+
+def test_load_snapshot_rejects_invalid_file(tmp_path):
+    path = tmp_path / "users.snapshot"
+    path.write_bytes(b"not a snapshot" * 4)
+    directory = UserDirectory()
+    try:
+        directory.load_snapshot(str(path))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
@@ -3,6 +3,10 @@ TMA Studio - Telegram Bot
 
 This bot launches the TMA Studio Mini App when users send /start command.
 Uses aiogram 3.x framework with proper error handling and logging.
+
+Runs as a single polling process by default. With BOT_WORKERS > 1 it runs
+as a supervisor that shards updates across worker processes by chat
+(see sharding.py).
 """
 
 import asyncio
@@ -13,10 +17,14 @@ from os import getenv
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from aiogram.filters import CommandStart
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, WebAppInfo
 
+from sharding import Supervisor, UpdateStore, ignore_termination_signals, serve_worker
+
 
 # Configure logging
 logging.basicConfig(
@@ -66,6 +74,19 @@ except ValueError as e:
     logger.error("Please set BOT_TOKEN and WEB_APP_URL in .env file")
     sys.exit(1)
 
+# Optional settings
+# BOT_WORKERS: Number of worker processes (1 = single process polling)
+# BOT_STATE_PATH: SQLite journal for offsets/dedup in supervisor mode; its
+#   directory must be writable by the service user (SQLite adds -wal/-shm)
+# TELEGRAM_API_URL: Bot API server base URL (e.g. a local fake_api.py)
+try:
+    BOT_WORKERS = int(getenv("BOT_WORKERS", "1"))
+except ValueError:
+    logger.error("BOT_WORKERS must be an integer")
+    sys.exit(1)
+BOT_STATE_PATH = getenv("BOT_STATE_PATH", "/var/lib/tma-studio/bot_state.sqlite3")
+TELEGRAM_API_URL = getenv("TELEGRAM_API_URL")
+
 
 # Initialize Dispatcher
 dp = Dispatcher()
@@ -136,6 +157,48 @@ async def command_start_handler(message: Message) -> None:
             logger.error(f"Failed to send error message: {fallback_error}")
 
 
+def create_bot() -> Bot:
+    """
+    Create a Bot instance with default properties.
+    
+    Source: aiogram 3.x documentation - Bot initialization
+    Verified: DefaultBotProperties sets parse_mode for all API calls
+    """
+    session = None
+    if TELEGRAM_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL))
+    
+    return Bot(
+        token=BOT_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
+
+
+def run_worker(index: int, inbox, acks, stop) -> None:
+    """
+    Entry point of a worker process in supervisor mode.
+    
+    Handles the updates routed to this worker with the shared Dispatcher.
+    """
+    ignore_termination_signals()
+    asyncio.run(serve_worker(dp, create_bot(), index, inbox, acks, stop))
+
+
+async def run_supervisor() -> None:
+    """
+    Run the sharding supervisor with BOT_WORKERS worker processes.
+    """
+    supervisor = Supervisor(
+        bot=create_bot(),
+        allowed_updates=dp.resolve_used_update_types(),
+        workers=BOT_WORKERS,
+        store=UpdateStore(BOT_STATE_PATH),
+        worker_target=run_worker,
+    )
+    await supervisor.run()
+
+
 async def main() -> None:
     """
     Main function to initialize bot and start polling.
@@ -146,13 +209,12 @@ async def main() -> None:
     - 11.5: Handle errors gracefully and log failures
     """
     try:
-        # Initialize Bot instance with default properties
-        # Source: aiogram 3.x documentation - Bot initialization
-        # Verified: DefaultBotProperties sets parse_mode for all API calls
-        bot = Bot(
-            token=BOT_TOKEN,
-            default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-        )
+        if BOT_WORKERS > 1:
+            logger.info(f"Starting supervisor with {BOT_WORKERS} workers...")
+            await run_supervisor()
+            return
+        
+        bot = create_bot()
         
         logger.info("Bot initialized successfully")
         logger.info("Starting polling...")
@@ -0,0 +1,157 @@
+"""
+TMA Studio - Local fake Telegram Bot API
+
+Replays a recorded burst of updates through getUpdates and records every
+sendMessage call, so the bot (single process or sharded supervisor) can be
+exercised locally without Telegram.
+
+Usage:
+    # Generate a burst of 1000 /start updates across 50 chats and serve it
+    python fake_api.py --generate 1000 --chats 50 --record burst.json
+
+    # Replay a recorded burst
+    python fake_api.py --updates burst.json
+
+    # Point the bot at it
+    TELEGRAM_API_URL=http://127.0.0.1:8081 BOT_WORKERS=4 python bot.py
+
+    # Check results: every chat should have received exactly one reply per
+    # /start (missing = dropped updates, duplicated = re-processed updates)
+    curl http://127.0.0.1:8081/stats
+
+Restarting or killing the bot mid-burst must not change the final stats.
+Stats are per server run; restart fake_api.py to replay from scratch.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake Bot", "username": "fake_bot"}
+
+
+def generate_burst(count: int, chats: int, seed: int = 0) -> list[dict]:
+    """Build `count` /start message updates spread randomly over `chats` chats"""
+    rng = random.Random(seed)
+    now = int(time.time())
+    updates = []
+    for update_id in range(1, count + 1):
+        chat_id = 100_000 + rng.randrange(chats)
+        updates.append({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": now,
+                "chat": {"id": chat_id, "type": "private", "first_name": f"User {chat_id}"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"},
+                "text": "/start",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+            },
+        })
+    return updates
+
+
+class FakeBotAPI:
+    """In-memory Bot API: serves updates by offset and records replies"""
+
+    def __init__(self, updates: list[dict]):
+        self.updates = sorted(updates, key=lambda u: u["update_id"])
+        self.confirmed = 0
+        self.sent: Counter = Counter()
+        self.expected = Counter(
+            u["message"]["chat"]["id"] for u in self.updates
+            if u.get("message", {}).get("text", "").startswith("/start")
+        )
+        self._message_id = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        handler = getattr(self, f"_{method.lower()}", None)
+        result = await handler(params) if handler else True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _getme(self, params: dict):
+        return BOT_USER
+
+    async def _getupdates(self, params: dict):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # Updates below offset are confirmed and never served again
+        self.confirmed = max(self.confirmed, offset - 1)
+        batch = [u for u in self.updates if u["update_id"] > self.confirmed][:limit]
+        if not batch and timeout:
+            # Short long-poll: nothing more is coming in a replay
+            await asyncio.sleep(min(timeout, 1))
+        return batch
+
+    async def _sendmessage(self, params: dict):
+        chat_id = int(params["chat_id"])
+        self.sent[chat_id] += 1
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": params.get("text", ""),
+        }
+
+    async def stats(self, request: web.Request) -> web.Response:
+        chats = set(self.expected) | set(self.sent)
+        missing = {c: self.expected[c] - self.sent[c] for c in chats if self.sent[c] < self.expected[c]}
+        duplicated = {c: self.sent[c] - self.expected[c] for c in chats if self.sent[c] > self.expected[c]}
+        return web.json_response({
+            "updates": len(self.updates),
+            "confirmed_through": self.confirmed,
+            "replies_expected": sum(self.expected.values()),
+            "replies_sent": sum(self.sent.values()),
+            "missing": {str(k): v for k, v in missing.items()},
+            "duplicated": {str(k): v for k, v in duplicated.items()},
+        })
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Local fake Telegram Bot API")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--updates", help="JSON file with a recorded list of updates")
+    source.add_argument("--generate", type=int, metavar="N", help="Generate N /start updates")
+    parser.add_argument("--chats", type=int, default=50, help="Chats for --generate (default: 50)")
+    parser.add_argument("--record", help="Write generated updates to this file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    if args.updates:
+        with open(args.updates, encoding="utf-8") as f:
+            updates = json.load(f)
+    else:
+        updates = generate_burst(args.generate, args.chats)
+        if args.record:
+            with open(args.record, "w", encoding="utf-8") as f:
+                json.dump(updates, f)
+            logger.info(f"Recorded {len(updates)} updates to {args.record}")
+
+    api = FakeBotAPI(updates)
+    app = web.Application()
+    app.router.add_get("/stats", api.stats)
+    app.router.add_post("/bot{token}/{method}", api.handle)
+
+    logger.info(f"Serving {len(updates)} updates on http://{args.host}:{args.port}")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
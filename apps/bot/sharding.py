@@ -0,0 +1,459 @@
+"""
+TMA Studio - Multi-process bot sharding
+
+Supervisor mode (BOT_WORKERS > 1) for bot.py:
+
+- One supervisor process long-polls getUpdates and routes each update to
+  one of N worker processes by chat_id hash, so all updates of a chat are
+  handled by the same worker. Workers handle a chat's updates strictly in
+  order (per-chat lock) while different chats run concurrently.
+- Every update is journaled in a small SQLite store *before* its offset is
+  confirmed to Telegram, and removed only when a worker acks it. A crash
+  or redeploy therefore never drops an update: unacked updates are
+  replayed from the journal on the next start.
+- Processed update_ids are remembered (bounded) so an update delivered
+  again is never handled twice.
+
+Delivery is at-least-once for the window between a handler finishing and
+its ack being recorded; everywhere else updates are handled exactly once.
+
+Shutdown: workers finish only their in-flight updates and drop the rest
+of their inbox (still pending in the journal, replayed on the next
+start). All workers share one WORKER_STOP_TIMEOUT_SECONDS deadline,
+below the unit's TimeoutStopSec; workers still alive then are killed.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import queue
+import signal
+import sqlite3
+import time
+from typing import Callable, Optional
+
+from aiogram import Bot, Dispatcher
+
+logger = logging.getLogger(__name__)
+
+# Update types whose payload carries a chat
+_CHAT_UPDATE_KEYS = (
+    "message",
+    "edited_message",
+    "channel_post",
+    "edited_channel_post",
+    "business_message",
+    "edited_business_message",
+    "message_reaction",
+    "message_reaction_count",
+    "chat_member",
+    "my_chat_member",
+    "chat_join_request",
+    "chat_boost",
+    "removed_chat_boost",
+)
+
+POLL_TIMEOUT_SECONDS = 30
+POLL_RETRY_SECONDS = 5
+PROCESSED_KEEP = 100_000
+WORKER_CHECK_SECONDS = 1.0
+INBOX_POLL_SECONDS = 0.2
+# Shared by all workers; must stay below TimeoutStopSec (45s) in
+# deploy/systemd/tma-studio-bot.service
+WORKER_STOP_TIMEOUT_SECONDS = 30
+_TERMINATION_SIGNALS = {signal.SIGINT, signal.SIGTERM}
+
+
+def chat_key(update: dict) -> int:
+    """
+    Routing key of a raw update: its chat id, else the sender's user id.
+
+    Falls back to update_id for updates without chat or sender.
+    """
+    for key in _CHAT_UPDATE_KEYS:
+        payload = update.get(key)
+        if payload and "chat" in payload:
+            return payload["chat"]["id"]
+
+    callback = update.get("callback_query")
+    if callback:
+        message = callback.get("message")
+        if message and "chat" in message:
+            return message["chat"]["id"]
+
+    for payload in update.values():
+        if isinstance(payload, dict) and "from" in payload:
+            return payload["from"]["id"]
+
+    return update["update_id"]
+
+
+def shard_for(update: dict, workers: int) -> int:
+    """Worker index for a raw update (stable for a given chat)"""
+    return chat_key(update) % workers
+
+
+class UpdateStore:
+    """
+    SQLite journal of received updates.
+
+    Tables:
+    - state: polling offset
+    - pending: updates received but not yet acked by a worker
+    - processed: recently handled update_ids (dedup, pruned to PROCESSED_KEEP)
+    """
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS pending (
+                update_id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS processed (
+                update_id INTEGER PRIMARY KEY,
+                processed_at REAL NOT NULL
+            );
+        """)
+
+    def offset(self) -> Optional[int]:
+        """Next getUpdates offset, or None on first start"""
+        row = self._db.execute("SELECT value FROM state WHERE key = 'offset'").fetchone()
+        return row[0] if row else None
+
+    def journal(self, updates: list[dict], next_offset: int) -> list[dict]:
+        """
+        Persist new updates and the next offset in one transaction.
+
+        Returns:
+            Updates that were neither processed nor already pending
+        """
+        fresh = []
+        with self._transaction():
+            for update in updates:
+                update_id = update["update_id"]
+                if self._db.execute(
+                    "SELECT 1 FROM processed WHERE update_id = ? "
+                    "UNION ALL SELECT 1 FROM pending WHERE update_id = ?",
+                    (update_id, update_id),
+                ).fetchone():
+                    continue
+                self._db.execute(
+                    "INSERT INTO pending (update_id, payload) VALUES (?, ?)",
+                    (update_id, json.dumps(update)),
+                )
+                fresh.append(update)
+            self._db.execute(
+                "INSERT INTO state (key, value) VALUES ('offset', ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+                (next_offset,),
+            )
+        return fresh
+
+    def pending(self) -> list[dict]:
+        """Unacked updates, oldest first"""
+        rows = self._db.execute("SELECT payload FROM pending ORDER BY update_id").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def mark_processed(self, update_id: int) -> None:
+        with self._transaction():
+            self._db.execute("DELETE FROM pending WHERE update_id = ?", (update_id,))
+            self._db.execute(
+                "INSERT OR IGNORE INTO processed (update_id, processed_at) VALUES (?, ?)",
+                (update_id, time.time()),
+            )
+
+    def prune(self, keep: int = PROCESSED_KEEP) -> None:
+        """Forget all but the newest `keep` processed update_ids"""
+        self._db.execute(
+            "DELETE FROM processed WHERE update_id <= "
+            "(SELECT update_id FROM processed ORDER BY update_id DESC LIMIT 1 OFFSET ?)",
+            (keep,),
+        )
+
+    def close(self) -> None:
+        self._db.close()
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+
+def _next_update(inbox: multiprocessing.Queue, stop) -> Optional[dict]:
+    """Blocking inbox read that returns None once `stop` is set"""
+    while not stop.is_set():
+        try:
+            return inbox.get(timeout=INBOX_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return None
+
+
+async def serve_worker(
+    dp: Dispatcher,
+    bot: Bot,
+    index: int,
+    inbox: multiprocessing.Queue,
+    acks: multiprocessing.Queue,
+    stop,
+) -> None:
+    """
+    Worker process loop: handle routed updates and ack them.
+
+    Updates of the same chat are handled one at a time, in arrival order
+    (asyncio.Lock is FIFO); different chats are handled concurrently.
+    Once the supervisor sets `stop` (a multiprocessing Event), stops
+    reading the inbox and exits after in-flight updates finish; unread
+    updates stay pending in the journal.
+    """
+    loop = asyncio.get_running_loop()
+    # chat key -> (lock, number of queued/running updates for that chat)
+    chat_locks: dict[int, list] = {}
+    in_flight: set[asyncio.Task] = set()
+
+    async def handle(update: dict) -> None:
+        key = chat_key(update)
+        entry = chat_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                try:
+                    await dp.feed_raw_update(bot, update)
+                except Exception as e:
+                    # Handler errors are final: retrying would not help, and an
+                    # unacked update would be replayed on every restart
+                    logger.error(
+                        f"Worker {index}: update {update['update_id']} failed: {e}",
+                        exc_info=True,
+                    )
+                acks.put(update["update_id"])
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                chat_locks.pop(key, None)
+
+    logger.info(f"Worker {index} started")
+    try:
+        while True:
+            update = await loop.run_in_executor(None, _next_update, inbox, stop)
+            if update is None:
+                break
+            task = asyncio.create_task(handle(update))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.gather(*in_flight)
+    finally:
+        await bot.session.close()
+        logger.info(f"Worker {index} stopped")
+
+
+def ignore_termination_signals() -> None:
+    """
+    Let the supervisor coordinate shutdown of workers.
+
+    Workers finish in-flight updates on the supervisor's stop event instead
+    of dying on SIGINT/SIGTERM mid-update (e.g. Ctrl+C or systemd stop).
+    Workers already start with both signals ignored (see
+    Supervisor._start_worker); this keeps them ignored and unblocks them.
+    """
+    for sig in _TERMINATION_SIGNALS:
+        signal.signal(sig, signal.SIG_IGN)
+    signal.pthread_sigmask(signal.SIG_UNBLOCK, _TERMINATION_SIGNALS)
+
+
+@contextlib.contextmanager
+def _termination_signals_ignored():
+    """
+    Start child processes with SIGINT/SIGTERM ignored.
+
+    SIG_IGN survives exec, so a spawned worker ignores both signals from
+    its first instruction, before it imports bot.py; otherwise Ctrl+C
+    during startup kills it mid-import. The signals are blocked meanwhile,
+    so one arriving now is delivered to the supervisor afterwards.
+    """
+    old_mask = signal.pthread_sigmask(signal.SIG_BLOCK, _TERMINATION_SIGNALS)
+    old_handlers = {sig: signal.signal(sig, signal.SIG_IGN) for sig in _TERMINATION_SIGNALS}
+    try:
+        yield
+    finally:
+        for sig, handler in old_handlers.items():
+            signal.signal(sig, handler)
+        signal.pthread_sigmask(signal.SIG_SETMASK, old_mask)
+
+
+class Supervisor:
+    """
+    Polls Telegram, journals updates and routes them to worker processes.
+
+    Args:
+        bot: Bot used for getUpdates
+        allowed_updates: Update types to request (dp.resolve_used_update_types())
+        workers: Number of worker processes
+        store: Update journal
+        worker_target: Picklable callable(index, inbox, acks, stop) run in each worker
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        allowed_updates: list[str],
+        workers: int,
+        store: UpdateStore,
+        worker_target: Callable,
+    ):
+        self._bot = bot
+        self._allowed_updates = allowed_updates
+        self._workers = workers
+        self._store = store
+        self._worker_target = worker_target
+        self._ctx = multiprocessing.get_context("spawn")
+        self._acks = self._ctx.Queue()
+        self._stop_event = self._ctx.Event()
+        self._inboxes: list = [None] * workers
+        self._processes: list = [None] * workers
+        self._stopping = asyncio.Event()
+
+    def _start_worker(self, index: int) -> None:
+        # Fresh inbox: whatever a dead worker left queued is replayed from
+        # the journal instead, so nothing is delivered twice
+        old_inbox = self._inboxes[index]
+        if old_inbox is not None:
+            # Nobody reads it any more: do not block exit flushing it
+            old_inbox.cancel_join_thread()
+
+        inbox = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=self._worker_target,
+            args=(index, inbox, self._acks, self._stop_event),
+            name=f"bot-worker-{index}",
+        )
+        with _termination_signals_ignored():
+            process.start()
+        self._inboxes[index] = inbox
+        self._processes[index] = process
+
+    def _dispatch(self, updates: list[dict], only_shard: Optional[int] = None) -> None:
+        for update in updates:
+            shard = shard_for(update, self._workers)
+            if only_shard is None or shard == only_shard:
+                self._inboxes[shard].put(update)
+
+    async def run(self) -> None:
+        """Run until SIGINT/SIGTERM, then drain workers"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopping.set)
+
+        for index in range(self._workers):
+            self._start_worker(index)
+
+        replay = self._store.pending()
+        if replay:
+            logger.info(f"Replaying {len(replay)} unacked update(s) from journal")
+            self._dispatch(replay)
+
+        tasks = [
+            asyncio.create_task(self._poll()),
+            asyncio.create_task(self._collect_acks()),
+            asyncio.create_task(self._watch_workers()),
+        ]
+        logger.info(f"Supervisor started with {self._workers} workers")
+
+        await self._stopping.wait()
+        logger.info("Supervisor stopping...")
+
+        tasks[0].cancel()
+        tasks[2].cancel()
+        await self._stop_workers()
+        self._acks.put(None)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        self._store.close()
+        await self._bot.session.close()
+        logger.info("Supervisor stopped")
+
+    async def _poll(self) -> None:
+        offset = self._store.offset()
+        polls = 0
+        while True:
+            try:
+                updates = await self._bot.get_updates(
+                    offset=offset,
+                    timeout=POLL_TIMEOUT_SECONDS,
+                    allowed_updates=self._allowed_updates,
+                    request_timeout=POLL_TIMEOUT_SECONDS + 10,
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"getUpdates failed: {e}")
+                await asyncio.sleep(POLL_RETRY_SECONDS)
+                continue
+
+            if not updates:
+                continue
+
+            raw = [
+                update.model_dump(mode="json", by_alias=True, exclude_none=True)
+                for update in updates
+            ]
+            offset = raw[-1]["update_id"] + 1
+            # Journal before the next getUpdates confirms them to Telegram
+            fresh = self._store.journal(raw, offset)
+            self._dispatch(fresh)
+
+            polls += 1
+            if polls % 1000 == 0:
+                self._store.prune()
+
+    async def _collect_acks(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            update_id = await loop.run_in_executor(None, self._acks.get)
+            if update_id is None:
+                return
+            self._store.mark_processed(update_id)
+
+    async def _watch_workers(self) -> None:
+        while True:
+            await asyncio.sleep(WORKER_CHECK_SECONDS)
+            for index, process in enumerate(self._processes):
+                if process.is_alive():
+                    continue
+                logger.error(f"Worker {index} exited with code {process.exitcode}, restarting")
+                self._start_worker(index)
+                self._dispatch(self._store.pending(), only_shard=index)
+
+    async def _stop_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._stop_event.set()
+        for inbox in self._inboxes:
+            # Unread updates are dropped; the journal replays them
+            inbox.cancel_join_thread()
+
+        deadline = time.monotonic() + WORKER_STOP_TIMEOUT_SECONDS
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, max(deadline - time.monotonic(), 0))
+
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                # Workers ignore SIGTERM, so terminate() would do nothing
+                logger.warning(f"Worker {index} did not stop in time, killing")
+                process.kill()
+                await loop.run_in_executor(None, process.join)
@@ -0,0 +1,89 @@
+"""Tests for update routing and the update journal (sharding.py)"""
+
+import pytest
+
+from sharding import UpdateStore, chat_key, shard_for
+
+
+def message(update_id, chat_id, user_id=1):
+    return {
+        "update_id": update_id,
+        "message": {"chat": {"id": chat_id}, "from": {"id": user_id}, "text": "hi"},
+    }
+
+
+def test_chat_key_message_chat():
+    assert chat_key(message(1, -100500, user_id=7)) == -100500
+
+
+def test_chat_key_callback_query_message_chat():
+    update = {
+        "update_id": 2,
+        "callback_query": {"from": {"id": 7}, "message": {"chat": {"id": 42}}},
+    }
+    assert chat_key(update) == 42
+
+
+def test_chat_key_falls_back_to_sender():
+    update = {"update_id": 3, "inline_query": {"from": {"id": 7}, "query": ""}}
+    assert chat_key(update) == 7
+
+
+def test_chat_key_falls_back_to_update_id():
+    assert chat_key({"update_id": 4, "poll": {"id": "p"}}) == 4
+
+
+def test_shard_for_is_stable_per_chat():
+    assert shard_for(message(1, 42), 4) == shard_for(message(2, 42, user_id=9), 4) == 42 % 4
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UpdateStore(str(tmp_path / "state.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_journal_records_offset_and_pending(store):
+    assert store.offset() is None
+    updates = [message(10, 1), message(11, 2)]
+
+    assert store.journal(updates, 12) == updates
+    assert store.offset() == 12
+    assert store.pending() == updates
+
+
+def test_journal_skips_pending_and_processed(store):
+    store.journal([message(10, 1), message(11, 2)], 12)
+    store.mark_processed(10)
+
+    assert store.pending() == [message(11, 2)]
+    # Redelivered after a crash before the offset was confirmed
+    assert store.journal([message(10, 1), message(11, 2), message(12, 3)], 13) == [message(12, 3)]
+    assert [update["update_id"] for update in store.pending()] == [11, 12]
+
+
+def test_state_survives_reopen(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    store = UpdateStore(path)
+    store.journal([message(10, 1), message(11, 2)], 12)
+    store.mark_processed(11)
+    store.close()
+
+    store = UpdateStore(path)
+    try:
+        assert store.offset() == 12
+        assert store.pending() == [message(10, 1)]
+        assert store.journal([message(11, 2)], 12) == []
+    finally:
+        store.close()
+
+
+def test_prune_keeps_newest_processed(store):
+    store.journal([message(update_id, 1) for update_id in range(1, 6)], 6)
+    for update_id in range(1, 6):
+        store.mark_processed(update_id)
+    store.prune(keep=2)
+
+    # Pruned ids are accepted again, kept ones are still deduplicated
+    assert [update["update_id"] for update in store.journal([message(3, 1), message(4, 1)], 6)] == [3]
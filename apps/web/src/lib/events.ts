@@ -0,0 +1,104 @@
+// apps/web/src/lib/events.ts
+// Batched activity event tracking (opens, theme switches, demo interactions)
+// Events are buffered client-side and sent to POST /api/events in batches
+
+const API_BASE_URL = import.meta.env.PUBLIC_API_URL || 'https://api.yourdomain.com';
+
+/** Max events per request (matches API EventBatchRequest limit) */
+const MAX_BATCH_SIZE = 100;
+
+/** Max time an event waits in the buffer before being sent */
+const FLUSH_INTERVAL_MS = 5000;
+
+/** Max buffered events; oldest are dropped beyond this (e.g. while backing off) */
+const MAX_BUFFER_SIZE = 500;
+
+interface TrackedEvent {
+  type: string;
+  payload?: Record<string, unknown>;
+}
+
+let buffer: TrackedEvent[] = [];
+let flushTimer: ReturnType<typeof setTimeout> | null = null;
+let backoffUntil = 0;
+let listenersAttached = false;
+
+function scheduleFlush(): void {
+  if (flushTimer === null) {
+    flushTimer = setTimeout(() => {
+      flushTimer = null;
+      void flush();
+    }, FLUSH_INTERVAL_MS);
+  }
+}
+
+function attachListeners(): void {
+  if (listenersAttached || typeof window === 'undefined') return;
+  listenersAttached = true;
+
+  // Flush when the Mini App is hidden/closed; keepalive lets the request
+  // outlive the page
+  document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'hidden') void flush(true);
+  });
+}
+
+/**
+ * Send buffered events to the API.
+ *
+ * @param keepalive - Use fetch keepalive (page is being hidden/unloaded)
+ *
+ * Failures are swallowed: tracking must never break the UI.
+ */
+export async function flush(keepalive = false): Promise<void> {
+  if (buffer.length === 0 || Date.now() < backoffUntil) return;
+
+  const batch = buffer.slice(0, MAX_BATCH_SIZE);
+  buffer = buffer.slice(batch.length);
+
+  try {
+    const response = await fetch(`${API_BASE_URL}/api/events`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      credentials: 'include', // Attribute events to the session user if any
+      body: JSON.stringify({ events: batch }),
+      keepalive,
+    });
+
+    if (response.status === 429) {
+      // Server queue is full: put the batch back and back off
+      const retryAfter = Number(response.headers.get('Retry-After')) || 5;
+      backoffUntil = Date.now() + retryAfter * 1000;
+      buffer = batch.concat(buffer).slice(-MAX_BUFFER_SIZE);
+    }
+  } catch (error) {
+    console.warn('[events] Failed to send events:', error);
+  }
+
+  if (buffer.length > 0) scheduleFlush();
+}
+
+/**
+ * Record an activity event.
+ *
+ * @param type - Event type, e.g. 'app_open', 'theme_switch', 'popup_shown'
+ * @param payload - Optional event details
+ */
+export function track(type: string, payload?: Record<string, unknown>): void {
+  if (typeof window === 'undefined') return;
+  attachListeners();
+
+  buffer.push({ type, payload });
+  if (buffer.length > MAX_BUFFER_SIZE) {
+    buffer = buffer.slice(-MAX_BUFFER_SIZE);
+  }
+
+  if (buffer.length >= MAX_BATCH_SIZE) {
+    void flush();
+  } else {
+    scheduleFlush();
+  }
+}
+
+export const events = { track, flush };
+export default events;
@@ -94,8 +94,13 @@ nginx -t
 
 # Step 8: Configure systemd services
 echo "⚙️  Step 8: Configuring systemd services..."
+# State directory for runtime files written by the services (user directory
+# snapshot, bot update journal); also managed by StateDirectory= in the units
+install -d -o www-data -g www-data -m 750 /var/lib/tma-studio
 cp $APP_DIR/deploy/systemd/tma-studio-api.service /etc/systemd/system/
 cp $APP_DIR/deploy/systemd/tma-studio-bot.service /etc/systemd/system/
+cp $APP_DIR/deploy/systemd/tma-studio-partitions.service /etc/systemd/system/
+cp $APP_DIR/deploy/systemd/tma-studio-partitions.timer /etc/systemd/system/
 
 systemctl daemon-reload
 
@@ -117,6 +122,18 @@ chmod 600 $APP_DIR/apps/bot/.env 2>/dev/null || true
 chown www-data:www-data $APP_DIR/apps/api/.env 2>/dev/null || true
 chown www-data:www-data $APP_DIR/apps/bot/.env 2>/dev/null || true
 
+# Step 10: Apply database migrations
+# Runner records applied versions in schema_migrations and uses lock_timeout
+# guards / CONCURRENTLY steps, so it is safe to run against a live database
+echo "🗄️  Step 10: Applying database migrations..."
+if [ -f "$APP_DIR/apps/api/.env" ]; then
+    cd $APP_DIR/apps/api
+    $APP_DIR/venv/bin/python -m app.migrate
+    cd $APP_DIR
+else
+    echo "⚠️  Skipping migrations: $APP_DIR/apps/api/.env not found"
+fi
+
 echo ""
 echo "✅ Deployment complete!"
 echo ""
@@ -133,9 +150,8 @@ echo ""
 echo "  3. Reload Nginx:"
 echo "     systemctl reload nginx"
 echo ""
-echo "  4. Apply database migrations:"
-echo "     export DATABASE_URL='your-database-url'"
-echo "     psql \$DATABASE_URL -f $APP_DIR/apps/api/migrations/001_initial.sql"
+echo "  4. Apply database migrations (if skipped above):"
+echo "     cd $APP_DIR/apps/api && $APP_DIR/venv/bin/python -m app.migrate"
 echo ""
 echo "  5. Configure SSL with Let's Encrypt:"
 echo "     certbot --nginx -d app.yourdomain.com -d api.yourdomain.com"
@@ -145,6 +161,7 @@ echo "     systemctl enable tma-studio-api.service"
 echo "     systemctl enable tma-studio-bot.service"
 echo "     systemctl start tma-studio-api.service"
 echo "     systemctl start tma-studio-bot.service"
+echo "     systemctl enable --now tma-studio-partitions.timer"
 echo ""
 echo "  7. Check service status:"
 echo "     systemctl status tma-studio-api.service"
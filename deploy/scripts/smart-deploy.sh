@@ -251,11 +251,24 @@ EOF
 
 # API config
 cat > /etc/nginx/sites-available/${API_DOMAIN} << EOF
+# Per-client limit for the public POST /api/events
+limit_req_zone \$binary_remote_addr zone=tma_events:10m rate=2r/s;
+
 server {
     listen 80;
     listen [::]:80;
     server_name ${API_DOMAIN};
 
+    location = /api/events {
+        limit_req zone=tma_events burst=20 nodelay;
+        limit_req_status 429;
+        proxy_pass http://127.0.0.1:${API_PORT};
+        proxy_set_header Host \$host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+    }
+
     location / {
         proxy_pass http://127.0.0.1:${API_PORT};
         proxy_http_version 1.1;
@@ -311,7 +324,10 @@ User=www-data
 Group=www-data
 WorkingDirectory=${PROJECT_DIR}/apps/api
 Environment="PATH=${PROJECT_DIR}/apps/api/venv/bin"
+StateDirectory=tma-studio
+StateDirectoryMode=0750
 ExecStart=${PROJECT_DIR}/apps/api/venv/bin/uvicorn app.main:app --host 127.0.0.1 --port ${API_PORT} --workers 4
+ExecReload=/bin/kill -HUP \$MAINPID
 Restart=always
 RestartSec=10
 
@@ -331,6 +347,8 @@ User=www-data
 Group=www-data
 WorkingDirectory=${PROJECT_DIR}/apps/bot
 Environment="PATH=${PROJECT_DIR}/apps/bot/venv/bin"
+StateDirectory=tma-studio
+StateDirectoryMode=0750
 ExecStart=${PROJECT_DIR}/apps/bot/venv/bin/python bot.py
 Restart=always
 RestartSec=10
@@ -16,6 +16,37 @@ fi
 
 APP_DIR="/opt/tma-studio"
 WEB_DIR="/var/www/tma-studio"
+API_READY_URL="${API_READY_URL:-http://127.0.0.1:8000/api/ready}"
+API_READY_TIMEOUT="${API_READY_TIMEOUT:-60}"
+
+# uvicorn worker processes (children of the service main process)
+api_worker_pids() {
+    local main_pid
+    main_pid=$(systemctl show -p MainPID --value tma-studio-api.service)
+    pgrep -P "$main_pid" -f spawn_main | sort || true
+}
+
+# Wait until none of the given worker pids is alive any more (all replaced),
+# then poll the API readiness endpoint until workers report ready
+wait_for_api_ready() {
+    local old_pids="$1"
+    local deadline=$((SECONDS + API_READY_TIMEOUT))
+    while [ -n "$old_pids" ] && [ -n "$(comm -12 <(echo "$old_pids") <(api_worker_pids))" ]; do
+        if [ $SECONDS -ge $deadline ]; then
+            echo "❌ API workers were not replaced within ${API_READY_TIMEOUT}s"
+            return 1
+        fi
+        sleep 1
+    done
+    until curl -fsS --max-time 2 "$API_READY_URL" > /dev/null 2>&1; do
+        if [ $SECONDS -ge $deadline ]; then
+            echo "❌ API did not become ready within ${API_READY_TIMEOUT}s"
+            return 1
+        fi
+        sleep 1
+    done
+    echo "✅ API ready: $(curl -fsS --max-time 2 "$API_READY_URL")"
+}
 
 # Step 1: Pull latest code
 echo "📥 Step 1: Pulling latest code..."
@@ -42,20 +73,52 @@ cp -r dist/* $WEB_DIR/
 chown -R www-data:www-data $WEB_DIR
 
 # Step 5: Apply new migrations (if any)
-echo "🗄️  Step 5: Checking for new migrations..."
-if [ -f "$APP_DIR/apps/api/migrations/002_*.sql" ]; then
-    echo "⚠️  New migrations found. Please apply them manually:"
-    echo "   export DATABASE_URL='your-database-url'"
-    echo "   psql \$DATABASE_URL -f $APP_DIR/apps/api/migrations/002_*.sql"
+# Runs before the restart so new code never sees an old schema.
+# Lock-aware: DDL fails fast (and retries) instead of blocking live traffic.
+# Also creates upcoming monthly events partitions.
+echo "🗄️  Step 5: Applying new migrations..."
+cd $APP_DIR/apps/api
+$APP_DIR/venv/bin/python -m app.migrate
+cd $APP_DIR
+
+# Step 6: Update systemd units
+# Installs that predate a unit change (e.g. ExecReload, StateDirectory, the
+# partitions timer) pick it up here. Changes to the API unit only apply to
+# a fresh process, so they force a full restart in step 7.
+echo "⚙️  Step 6: Updating systemd units..."
+install -d -o www-data -g www-data -m 750 /var/lib/tma-studio
+API_UNIT_CHANGED=0
+if ! cmp -s $APP_DIR/deploy/systemd/tma-studio-api.service /etc/systemd/system/tma-studio-api.service; then
+    API_UNIT_CHANGED=1
 fi
+cp $APP_DIR/deploy/systemd/tma-studio-api.service /etc/systemd/system/
+cp $APP_DIR/deploy/systemd/tma-studio-bot.service /etc/systemd/system/
+cp $APP_DIR/deploy/systemd/tma-studio-partitions.service /etc/systemd/system/
+cp $APP_DIR/deploy/systemd/tma-studio-partitions.timer /etc/systemd/system/
+systemctl daemon-reload
+systemctl enable --now tma-studio-partitions.timer
 
-# Step 6: Restart services
-echo "🔄 Step 6: Restarting services..."
-systemctl restart tma-studio-api.service
+# Step 7: Restart services
+# API: rolling reload (SIGHUP). uvicorn stops each old worker before it
+# spawns the replacement, so one worker's capacity is missing during each
+# swap (until the new worker has warmed up); the remaining workers keep
+# serving, so the API never goes down. Full restart if it is not running,
+# its unit changed, or the unit has no ExecReload
+echo "🔄 Step 7: Restarting services..."
+OLD_API_WORKERS=""
+if systemctl is-active --quiet tma-studio-api.service \
+    && [ "$API_UNIT_CHANGED" -eq 0 ] \
+    && [ "$(systemctl show -p CanReload --value tma-studio-api.service)" = "yes" ]; then
+    OLD_API_WORKERS=$(api_worker_pids)
+    systemctl reload tma-studio-api.service
+else
+    systemctl restart tma-studio-api.service
+fi
+wait_for_api_ready "$OLD_API_WORKERS"
 systemctl restart tma-studio-bot.service
 
-# Step 7: Check service status
-echo "✅ Step 7: Checking service status..."
+# Step 8: Check service status
+echo "✅ Step 8: Checking service status..."
 systemctl status tma-studio-api.service --no-pager
 systemctl status tma-studio-bot.service --no-pager
 